@@ -1,15 +1,12 @@
 # Alembic 环境配置
+import os
 from logging.config import fileConfig
-from sqlalchemy import engine_from_config
-from sqlalchemy import pool
 from alembic import context
-import asyncio
-from sqlalchemy.ext.asyncio import AsyncEngine
 
 # 导入模型
 import sys
 sys.path.append('.')
-from app.database import Base
+from app.database import Base, create_sync_engine, make_sync_url
 from app.models import User, Department, Team, Project, Task
 from app.models import MaterialCategory, Material, ProcurementOrder, Inventory, InventoryLog, Attachment
 from app.models import Notification, AuditLog
@@ -24,12 +21,16 @@ if config.config_file_name is not None:
 # 目标元数据
 target_metadata = Base.metadata
 
+# 迁移使用同步驱动：优先环境变量 DATABASE_URL，其次 alembic.ini
+database_url = make_sync_url(
+    os.getenv("DATABASE_URL") or config.get_main_option("sqlalchemy.url")
+)
+
 
 def run_migrations_offline():
     """离线迁移"""
-    url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url,
+        url=database_url,
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
@@ -39,30 +40,19 @@ def run_migrations_offline():
         context.run_migrations()
 
 
-async def run_migrations_online():
+def run_migrations_online():
     """在线迁移"""
-    connectable = AsyncEngine(
-        engine_from_config(
-            config.get_section(config.config_ini_section),
-            prefix="sqlalchemy.",
-            poolclass=pool.NullPool,
-            future=True,
-        )
-    )
-
-    async with connectable.connect() as connection:
-        await connection.run_sync(do_run_migrations)
+    connectable = create_sync_engine(database_url)
 
-    await connectable.dispose()
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
 
-
-def do_run_migrations(connection):
-    context.configure(connection=connection, target_metadata=target_metadata)
-    with context.begin_transaction():
-        context.run_migrations()
+    connectable.dispose()
 
 
 if context.is_offline_mode():
     run_migrations_offline()
 else:
-    asyncio.run(run_migrations_online())
+    run_migrations_online()
@@ -14,9 +14,40 @@ class Settings:
     # 数据库配置
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./data/yacht_mes.db")
     
+    # 连接池配置（queue: 连接池；null: 不复用连接，适用于 PgBouncer 事务模式）
+    DB_POOL_MODE: str = os.getenv("DB_POOL_MODE", "queue")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # 获取连接超时（秒）
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 连接回收周期（秒）
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    
     # Redis 配置
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     
+    # 进程内一级缓存：最大条目数、最长驻留时间（秒）；Redis 故障后的重试间隔（秒）
+    CACHE_L1_MAX_ENTRIES: int = int(os.getenv("CACHE_L1_MAX_ENTRIES", "1024"))
+    CACHE_L1_TTL: int = int(os.getenv("CACHE_L1_TTL", "5"))
+    CACHE_REDIS_RETRY: int = int(os.getenv("CACHE_REDIS_RETRY", "10"))
+    # Redis 连接 / 读写超时（秒），超时按故障处理，回退为仅使用本地缓存
+    CACHE_REDIS_CONNECT_TIMEOUT: float = float(os.getenv("CACHE_REDIS_CONNECT_TIMEOUT", "0.5"))
+    CACHE_REDIS_TIMEOUT: float = float(os.getenv("CACHE_REDIS_TIMEOUT", "0.5"))
+    # 提交后 Redis 缓存失效的最长等待（秒）
+    CACHE_INVALIDATE_TIMEOUT: float = float(os.getenv("CACHE_INVALIDATE_TIMEOUT", "1.0"))
+    
+    # 仪表盘统计快照有效期（秒），写操作会提前失效
+    DASHBOARD_STATS_TTL: int = int(os.getenv("DASHBOARD_STATS_TTL", "30"))
+    
+    # 物料库存汇总缓存有效期（秒），库存变动提交后按物料失效
+    MATERIAL_STOCK_TTL: int = int(os.getenv("MATERIAL_STOCK_TTL", "300"))
+    
+    # 库存预警列表缓存有效期（秒），预警变化或相关库存变动提交后失效；接收预警通知的角色
+    INVENTORY_ALERTS_TTL: int = int(os.getenv("INVENTORY_ALERTS_TTL", "3600"))
+    INVENTORY_ALERT_ROLES: List[str] = os.getenv("INVENTORY_ALERT_ROLES", "admin,dept_manager").split(",")
+    
+    # 项目进度计划（关键路径）缓存有效期（秒），任务或依赖变化提交后失效
+    PROJECT_SCHEDULE_TTL: int = int(os.getenv("PROJECT_SCHEDULE_TTL", "3600"))
+    
     # JWT 配置
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
@@ -1,11 +1,18 @@
 """
-数据库配置 - 兼容 Python 3.6 + SQLAlchemy 1.4
+数据库配置 - SQLAlchemy 2.0 异步引擎
+PostgreSQL 使用 asyncpg，SQLite 使用 aiosqlite；同步引擎仅供 Alembic 迁移使用
 """
 
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.pool import NullPool
+import time
+from typing import Any, AsyncGenerator, Dict, Optional
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from app.config import settings
 
 # 检测环境
 DATABASE_URL = os.getenv("DATABASE_URL", "")
@@ -17,34 +24,167 @@ if not DATABASE_URL:
 else:
     print("Using database")
 
-# 创建引擎（同步模式，兼容 Python 3.6）
-if "sqlite" in DATABASE_URL:
-    engine = create_engine(
-        DATABASE_URL,
+
+def make_async_url(url: str) -> str:
+    """转换为异步驱动 URL（asyncpg / aiosqlite）"""
+    # Railway / Heroku 注入的 postgres:// 前缀
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect == "postgresql":
+        return f"postgresql+asyncpg{sep}{rest}"
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
+
+def make_sync_url(url: str) -> str:
+    """转换为同步驱动 URL（psycopg2 / pysqlite），仅供迁移使用"""
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect in ("postgresql", "sqlite"):
+        return f"{dialect}{sep}{rest}"
+    return url
+
+
+ASYNC_DATABASE_URL = make_async_url(DATABASE_URL)
+SYNC_DATABASE_URL = make_sync_url(DATABASE_URL)
+
+
+class PoolMetrics:
+    """连接获取等待时间统计（直方图，单位毫秒）"""
+
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.buckets = [0] * (len(self.BUCKETS_MS) + 1)  # 最后一格为 +Inf
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.timeouts = 0
+
+    def observe(self, wait_ms: float):
+        """记录一次连接获取耗时"""
+        self.count += 1
+        self.total_ms += wait_ms
+        if wait_ms > self.max_ms:
+            self.max_ms = wait_ms
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if wait_ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        histogram = {f"le_{bound}ms": n for bound, n in zip(self.BUCKETS_MS, self.buckets)}
+        histogram["le_inf"] = self.buckets[-1]
+        return {
+            "acquisitions": self.count,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_ms / self.count, 3) if self.count else 0,
+            "max_wait_ms": round(self.max_ms, 3),
+            "wait_histogram": histogram
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """记录连接获取等待时间的连接池"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.observe((time.perf_counter() - start) * 1000)
+
+
+# 创建异步引擎
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        echo=False
+    )
+elif settings.DB_POOL_MODE == "null":
+    engine = create_async_engine(
+        ASYNC_DATABASE_URL,
         echo=False,
-        connect_args={"check_same_thread": False}
+        poolclass=NullPool
     )
 else:
-    engine = create_engine(
-        DATABASE_URL,
+    engine = create_async_engine(
+        ASYNC_DATABASE_URL,
         echo=False,
-        poolclass=NullPool
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING
     )
 
 # 会话工厂
-SessionLocal = sessionmaker(
-    autocommit=False,
+AsyncSessionLocal = async_sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
     autoflush=False,
-    bind=engine
+    expire_on_commit=False
 )
 
 Base = declarative_base()
 
 
 # 获取数据库会话
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def get_pool_status() -> Dict[str, Any]:
+    """连接池状态：已借出 / 空闲 / 溢出连接数及获取等待统计"""
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__}
+
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0)
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update({
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "timeout": settings.DB_POOL_TIMEOUT,
+            "recycle": settings.DB_POOL_RECYCLE,
+            "pre_ping": settings.DB_POOL_PRE_PING
+        })
+        status.update(pool_metrics.snapshot())
+
+    return status
+
+
+def create_sync_engine(url: Optional[str] = None) -> Engine:
+    """创建同步引擎（仅供 Alembic 迁移使用，不参与请求处理）"""
+    url = make_sync_url(url or DATABASE_URL)
+
+    if url.startswith("sqlite"):
+        return create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            poolclass=NullPool
+        )
+    return create_engine(url, poolclass=NullPool)
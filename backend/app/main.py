@@ -7,10 +7,12 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import text
 import os
+import time
 
 from app.config import settings
-from app.database import engine, Base
+from app.database import engine, Base, get_pool_status
 from app.routers import auth, users, projects, tasks, materials, procurement, inventory, attachments, ai, dashboard, import_data, notifications, audit
 
 
@@ -39,12 +41,38 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 
+# 关闭时释放连接池
+@app.on_event("shutdown")
+async def shutdown():
+    await engine.dispose()
+
+
 # 健康检查
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "service": "yacht-mes-api", "version": "1.0.0"}
 
 
+# 数据库健康检查 - 连接池指标
+@app.get("/health/db")
+async def health_check_db():
+    start = time.perf_counter()
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "error", "detail": str(e), "pool": get_pool_status()}
+        )
+
+    return {
+        "status": "ok",
+        "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+        "pool": get_pool_status()
+    }
+
+
 # 根路径 - 返回登录页面
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -1,6 +1,9 @@
 from app.models.user import User, Department, Team
-from app.models.project import Project, Task
-from app.models.material import MaterialCategory, Material, ProcurementOrder, Inventory, InventoryLog, Attachment
+from app.models.project import Project, Task, TaskDependency, WorkReport
+from app.models.material import (
+    MaterialCategory, Material, ProcurementOrder, Inventory, InventoryLog, StockBalance, MaterialStock, StockAlert,
+    Attachment
+)
 
 # 从 schema.sql 导入其他模型
 from app.database import Base
@@ -44,7 +47,8 @@ class AuditLog(Base):
 
 __all__ = [
     "User", "Department", "Team",
-    "Project", "Task",
-    "MaterialCategory", "Material", "ProcurementOrder", "Inventory", "InventoryLog", "Attachment",
+    "Project", "Task", "TaskDependency", "WorkReport",
+    "MaterialCategory", "Material", "ProcurementOrder", "Inventory", "InventoryLog",
+    "StockBalance", "MaterialStock", "StockAlert", "Attachment",
     "Notification", "AuditLog"
 ]
@@ -2,7 +2,9 @@
 SQLAlchemy 数据模型 - 物料和库存
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Numeric, ARRAY
+from sqlalchemy import (
+    Column, Integer, String, DateTime, ForeignKey, Text, Numeric, ARRAY, Index, UniqueConstraint
+)
 from sqlalchemy.dialects.postgresql import JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -111,6 +113,22 @@ class Inventory(Base):
     
     # 关系
     material = relationship("Material", back_populates="inventory_items")
+    
+    __table_args__ = (
+        # 非批次库存每个仓库只有一行，出入库按此做 upsert
+        Index(
+            "uq_inventory_material_warehouse",
+            "material_id",
+            "warehouse",
+            unique=True,
+            postgresql_where=batch_no.is_(None),
+            sqlite_where=batch_no.is_(None)
+        ),
+        # 批次号在同一物料内唯一，批次入库按此做 upsert
+        UniqueConstraint("material_id", "batch_no", name="inventory_material_id_batch_no_key"),
+        # 出库按 FIFO / FEFO 分配批次时取候选批次
+        Index("idx_inventory_allocation", "material_id", "warehouse", "qc_status", "expiry_date"),
+    )
 
 
 class InventoryLog(Base):
@@ -138,6 +156,35 @@ class InventoryLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class StockBalance(Base):
+    """库存余额（物料 + 仓库，含各批次），出入库时在同一事务内增量维护"""
+    __tablename__ = "stock_balances"
+    
+    material_id = Column(Integer, ForeignKey("materials.id"), primary_key=True)
+    warehouse = Column(String(50), primary_key=True)
+    quantity = Column(Numeric(12, 2), nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class MaterialStock(Base):
+    """物料总库存（各仓库合计），出入库时在同一事务内增量维护"""
+    __tablename__ = "material_stock"
+    
+    material_id = Column(Integer, ForeignKey("materials.id"), primary_key=True)
+    quantity = Column(Numeric(12, 2), nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class StockAlert(Base):
+    """生效中的库存预警（每物料至多一条），库存跨越阈值时增量维护"""
+    __tablename__ = "stock_alerts"
+    
+    material_id = Column(Integer, ForeignKey("materials.id"), primary_key=True)
+    level = Column(String(20), nullable=False)  # warning: 低于安全库存, critical: 低于最低库存
+    raised_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class Attachment(Base):
     __tablename__ = "attachments"
     
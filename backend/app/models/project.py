@@ -2,7 +2,7 @@
 SQLAlchemy 数据模型 - 项目和任务
 """
 
-from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Text, ARRAY, UniqueConstraint, JSON, Numeric
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Text, ARRAY, UniqueConstraint, JSON, Numeric, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -51,6 +51,10 @@ class Task(Base):
     actual_start = Column(Date)
     actual_end = Column(Date)
     duration_days = Column(Integer)
+    # 预计开始 / 完成：按实际进度与前置任务推算，forecast_delay_days 为预计完成晚于计划完成的天数
+    forecast_start = Column(Date)
+    forecast_end = Column(Date)
+    forecast_delay_days = Column(Integer, default=0)
     
     planned_work_hours = Column(Integer)
     actual_work_hours = Column(Integer, default=0)
@@ -81,4 +85,45 @@ class Task(Base):
     __table_args__ = (
         # 联合唯一约束
         UniqueConstraint('project_id', 'task_no', name='unique_project_task_no'),
+        # WBS 递归查询按父任务逐层展开
+        Index("idx_tasks_parent", "parent_id"),
+    )
+
+
+class TaskDependency(Base):
+    """任务依赖（task_id 依赖 depends_on_task_id），进度计划按此构建任务 DAG"""
+    __tablename__ = "task_dependencies"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"))
+    depends_on_task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"))
+    # finish_to_start, start_to_start, finish_to_finish, start_to_finish
+    dependency_type = Column(String(20), default="finish_to_start")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint("task_id", "depends_on_task_id", name="task_dependencies_task_id_depends_on_task_id_key"),
+        # 由前置任务查后续任务（下游传播）
+        Index("idx_task_dependencies_depends_on", "depends_on_task_id"),
+    )
+
+
+class WorkReport(Base):
+    """报工流水（只追加），任务的实际工时由流水原子累加"""
+    __tablename__ = "work_reports"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    work_hours = Column(Integer, nullable=False)
+    progress_percent = Column(Integer, nullable=False)
+    remark = Column(Text)
+    photo_urls = Column(ARRAY(String))
+    # 终端生成的报工 id，离线同步重试时去重
+    client_id = Column(String(64), unique=True)
+    reported_at = Column(DateTime, default=datetime.utcnow)  # 终端报工时间（离线报工晚于此时同步）
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("idx_work_reports_task", "task_id", "reported_at"),
     )
@@ -23,7 +23,7 @@ class Department(Base):
     # 关系
     leader = relationship("User", foreign_keys=[leader_id], back_populates="led_department")
     teams = relationship("Team", back_populates="department")
-    users = relationship("User", back_populates="department")
+    users = relationship("User", foreign_keys="User.dept_id", back_populates="department")
 
 
 class Team(Base):
@@ -42,7 +42,7 @@ class Team(Base):
     # 关系
     department = relationship("Department", back_populates="teams")
     leader = relationship("User", foreign_keys=[leader_id], back_populates="led_team")
-    users = relationship("User", back_populates="team")
+    users = relationship("User", foreign_keys="User.team_id", back_populates="team")
 
 
 class User(Base):
@@ -2,7 +2,7 @@
 审计日志 API
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime
@@ -10,6 +10,7 @@ from datetime import datetime
 from app.database import get_db
 from app.services.audit_service import AuditService
 from app.utils.security import check_permission, get_current_user
+from app.utils.query import MAX_PAGE_SIZE
 
 router = APIRouter()
 
@@ -21,8 +22,9 @@ async def list_audit_logs(
     resource_type: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(check_permission("admin"))
 ):
@@ -35,7 +37,8 @@ async def list_audit_logs(
         start_date=start_date,
         end_date=end_date,
         skip=skip,
-        limit=limit
+        limit=limit,
+        cursor=cursor
     )
     return logs
 
@@ -6,86 +6,106 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from datetime import datetime, timedelta
+from typing import Optional
 
+from app.config import settings
 from app.database import get_db
-from app.models import Project, Task, Material, ProcurementOrder, User
+from app.models import Project, Task, ProcurementOrder, User, StockAlert
+from app.services.progress_service import task_stats_subquery, calc_progress
+from app.utils.cache import Cache, cache
 from app.utils.security import get_current_user
 
 router = APIRouter()
 
 
+def stats_query(today):
+    """仪表盘统计：四项指标合并为一条 SQL"""
+    return select(
+        select(func.count(Project.id))
+        .where(Project.status == "in_progress")
+        .scalar_subquery().label("active_projects"),
+        select(func.count(Task.id))
+        .where(Task.plan_start <= today, Task.plan_end >= today)
+        .scalar_subquery().label("today_tasks"),
+        select(func.count(ProcurementOrder.id))
+        .where(ProcurementOrder.status == "pending_approval")
+        .scalar_subquery().label("pending_procurement"),
+        # 库存低于最低库存的物料（读生效中的预警）
+        select(func.count(StockAlert.material_id))
+        .where(StockAlert.level == "critical")
+        .scalar_subquery().label("inventory_alerts")
+    )
+
+
 @router.get("/stats")
 async def get_dashboard_stats(
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """获取仪表盘统计数据"""
-    
-    # 项目统计
-    project_result = await db.execute(
-        select(func.count(Project.id)).where(Project.status == "in_progress")
-    )
-    active_projects = project_result.scalar()
+    """获取仪表盘统计数据（缓存快照，相关表提交后或到期后刷新）"""
+    cache_key = Cache.dashboard_stats_key()
     
-    # 今日任务
-    today = datetime.now().date()
-    task_result = await db.execute(
-        select(func.count(Task.id))
-        .where(Task.plan_start <= today)
-        .where(Task.plan_end >= today)
-    )
-    today_tasks = task_result.scalar()
+    snapshot = await cache.get(cache_key)
+    if snapshot is not None:
+        return snapshot
     
-    # 待审批采购
-    procurement_result = await db.execute(
-        select(func.count(ProcurementOrder.id))
-        .where(ProcurementOrder.status == "pending_approval")
-    )
-    pending_procurement = procurement_result.scalar()
+    result = await db.execute(stats_query(datetime.now().date()))
+    stats = dict(result.one()._mapping)
     
-    # 库存预警
-    from app.models import Inventory
-    material_result = await db.execute(
-        select(func.count(Material.id))
-        .outerjoin(Inventory, Material.id == Inventory.material_id)
-        .group_by(Material.id)
-        .having(func.sum(Inventory.quantity) < Material.min_stock)
+    await cache.set(
+        cache_key,
+        stats,
+        expire=settings.DASHBOARD_STATS_TTL,
+        tags=("projects", "tasks", "stock_alerts", "procurement_orders")
     )
-    inventory_alerts = len(material_result.all())
     
-    return {
-        "active_projects": active_projects,
-        "today_tasks": today_tasks,
-        "pending_procurement": pending_procurement,
-        "inventory_alerts": inventory_alerts
-    }
+    return stats
 
 
 @router.get("/project-progress")
 async def get_project_progress(
+    limit: Optional[int] = 5,
+    weighted: bool = False,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """获取项目进度数据"""
-    result = await db.execute(
-        select(Project.id, Project.yacht_name, Project.status)
+    """
+    获取项目进度数据
+    
+    limit 为空或 0 时返回全部在建项目；weighted=true 时按计划工时加权
+    """
+    page = (
+        select(Project.id)
         .where(Project.status.in_(["in_progress", "planning"]))
-        .limit(5)
+        .order_by(Project.id)
+    )
+    if limit:
+        page = page.limit(limit)
+    page = page.cte("progress_projects")
+    stats = task_stats_subquery(select(page.c.id))
+    
+    result = await db.execute(
+        select(
+            Project.yacht_name,
+            Project.status,
+            stats.c.total_tasks,
+            stats.c.progress_sum,
+            stats.c.weighted_progress_sum,
+            stats.c.hours_sum
+        )
+        .join(page, page.c.id == Project.id)
+        .outerjoin(stats, stats.c.project_id == Project.id)
+        .order_by(Project.id)
     )
-    projects = result.all()
     
     progress_data = []
-    for project_id, yacht_name, status in projects:
-        # 计算项目进度
-        task_result = await db.execute(
-            select(func.avg(Task.progress_percent))
-            .where(Task.project_id == project_id)
+    for yacht_name, status, total_tasks, progress_sum, weighted_progress_sum, hours_sum in result.all():
+        progress = calc_progress(
+            total_tasks, progress_sum, weighted_progress_sum, hours_sum, weighted=weighted
         )
-        avg_progress = task_result.scalar() or 0
-        
         progress_data.append({
             "name": yacht_name,
-            "progress": round(avg_progress, 1),
+            "progress": round(progress, 1),
             "status": status
         })
     
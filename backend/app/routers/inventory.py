@@ -2,13 +2,20 @@
 库存管理 API
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import List
+from sqlalchemy import select, insert, func
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import List, Optional
 
+from app.config import settings
 from app.database import get_db
-from app.models import Inventory, InventoryLog, Material
+from app.models import Inventory, InventoryLog, Material, MaterialStock, StockAlert, StockBalance
+from app.schemas.inventory import AllocationStrategy, InventoryBatchTransaction, TransactionType
+from app.services.inventory_service import InventoryService, InsufficientStockError, BatchConflictError
+from app.utils.cache import Cache, cache
+from app.utils.query import paginate, cursor_page, MAX_PAGE_SIZE
 from app.utils.security import check_permission, get_current_user
 
 router = APIRouter()
@@ -16,10 +23,11 @@ router = APIRouter()
 
 @router.get("")
 async def list_inventory(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     material_id: int = None,
     warehouse: str = None,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -31,11 +39,11 @@ async def list_inventory(
     if warehouse:
         query = query.where(Inventory.warehouse == warehouse)
     
-    query = query.offset(skip).limit(limit)
+    query = paginate(query, (Inventory.id,), skip, limit, cursor)
     result = await db.execute(query)
     inventory_items = result.scalars().all()
     
-    return inventory_items
+    return cursor_page(inventory_items, limit, cursor, key=lambda item: (item.id,))
 
 
 @router.post("/transaction")
@@ -44,55 +52,66 @@ async def inventory_transaction(
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(check_permission("team_leader"))
 ):
-    """库存出入库操作"""
+    """
+    库存出入库操作（库存增减在数据库内原子完成，见 InventoryService）
+    
+    出库未指定批次号时按 strategy（fifo / fefo，默认 fefo）在质检合格的批次间分配，
+    每个消耗的批次记一条库存日志。
+    """
     material_id = transaction_data.get("material_id")
     transaction_type = transaction_data.get("type")  # in, out
-    quantity = transaction_data.get("quantity")
+    warehouse = transaction_data.get("warehouse", "main")
     
-    # 查找或创建库存记录
-    result = await db.execute(
-        select(Inventory).where(
-            Inventory.material_id == material_id,
-            Inventory.warehouse == transaction_data.get("warehouse", "main")
-        )
-    )
-    inventory = result.scalar_one_or_none()
+    if transaction_type not in ("in", "out"):
+        raise HTTPException(status_code=400, detail="无效的操作类型")
+    try:
+        quantity = Decimal(str(transaction_data.get("quantity")))
+    except InvalidOperation:
+        raise HTTPException(status_code=400, detail="无效的数量")
+    if not quantity.is_finite() or quantity <= 0:
+        raise HTTPException(status_code=400, detail="数量必须大于 0")
+    try:
+        strategy = AllocationStrategy(transaction_data.get("strategy") or AllocationStrategy.FEFO)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的分配策略")
+    expiry_date = transaction_data.get("expiry_date")
+    if expiry_date:
+        try:
+            expiry_date = datetime.fromisoformat(expiry_date)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="无效的有效期")
     
-    if not inventory:
-        inventory = Inventory(
-            material_id=material_id,
-            warehouse=transaction_data.get("warehouse", "main"),
+    try:
+        postings = await InventoryService(db).apply(
+            material_id,
+            warehouse,
+            transaction_type,
+            quantity,
             location=transaction_data.get("location"),
-            quantity=0
+            batch_no=transaction_data.get("batch_no"),
+            qc_status=transaction_data.get("qc_status"),
+            expiry_date=expiry_date,
+            strategy=strategy
         )
-        db.add(inventory)
-        await db.flush()
-    
-    # 记录操作前数量
-    before_qty = inventory.quantity
-    
-    # 更新库存
-    if transaction_type == "in":
-        inventory.quantity += quantity
-    elif transaction_type == "out":
-        if inventory.quantity < quantity:
-            raise HTTPException(status_code=400, detail="库存不足")
-        inventory.quantity -= quantity
-    
-    # 创建库存日志
-    log = InventoryLog(
-        material_id=material_id,
-        inventory_id=inventory.id,
-        type=transaction_type,
-        quantity=quantity,
-        before_qty=before_qty,
-        after_qty=inventory.quantity,
-        related_task_id=transaction_data.get("related_task_id"),
-        operator_id=current_user.get("id"),
-        operator_name=current_user.get("username"),
-        remark=transaction_data.get("remark")
-    )
-    db.add(log)
+    except InsufficientStockError:
+        raise HTTPException(status_code=400, detail="库存不足")
+    except BatchConflictError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # 创建库存日志（每个库存行一条）
+    for posting in postings:
+        db.add(InventoryLog(
+            material_id=material_id,
+            inventory_id=posting["inventory_id"],
+            type=transaction_type,
+            quantity=posting["quantity"],
+            before_qty=posting["before_qty"],
+            after_qty=posting["after_qty"],
+            related_task_id=transaction_data.get("related_task_id"),
+            operator_id=current_user.get("id"),
+            operator_name=current_user.get("username"),
+            remark=transaction_data.get("remark")
+        ))
     
     await db.commit()
     
@@ -100,30 +119,123 @@ async def inventory_transaction(
         "message": "操作成功",
         "inventory": {
             "material_id": material_id,
-            "quantity": inventory.quantity
-        }
+            "quantity": postings[-1]["after_qty"]
+        },
+        "batches": [
+            {
+                "inventory_id": posting["inventory_id"],
+                "batch_no": posting["batch_no"],
+                "quantity": posting["quantity"],
+                "after_qty": posting["after_qty"]
+            }
+            for posting in postings
+        ]
+    }
+
+
+@router.post("/transaction/batch")
+async def inventory_batch_transaction(
+    batch: InventoryBatchTransaction,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(check_permission("team_leader"))
+):
+    """
+    批量出入库 / 调拨（领料单、配套发料）
+    
+    全部行一起校验、在同一事务内完成，任一行失败则整体不生效；
+    出库 / 调出按批次分配（同单笔出库），库存日志每个消耗的批次一条，以一条多行 INSERT 写入。
+    """
+    for index, line in enumerate(batch.lines, start=1):
+        if line.type == TransactionType.TRANSFER and (
+            not line.to_warehouse or line.to_warehouse == line.warehouse
+        ):
+            raise HTTPException(status_code=400, detail=f"第 {index} 行调拨目标仓库无效")
+        if line.type == TransactionType.IN and line.batch_no:
+            raise HTTPException(status_code=400, detail=f"第 {index} 行：批次入库请使用单笔入库")
+    
+    material_ids = {line.material_id for line in batch.lines}
+    result = await db.execute(select(Material.id).where(Material.id.in_(material_ids)))
+    missing = material_ids - set(result.scalars().all())
+    if missing:
+        raise HTTPException(status_code=400, detail=f"物料不存在: {sorted(missing)}")
+    
+    try:
+        postings = await InventoryService(db).apply_lines(batch.lines)
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=400, detail=f"第 {e.line} 行库存不足" if e.line else "库存不足")
+    
+    log_rows = []
+    for posting in postings:
+        line = batch.lines[posting["line"] - 1]
+        log_rows.append({
+            "material_id": posting["material_id"],
+            "inventory_id": posting["inventory_id"],
+            "type": line.type.value,
+            "quantity": posting["quantity"],
+            "before_qty": posting["before_qty"],
+            "after_qty": posting["after_qty"],
+            "related_task_id": line.related_task_id,
+            "operator_id": current_user.get("id"),
+            "operator_name": current_user.get("username"),
+            "remark": line.remark or batch.remark
+        })
+    await db.execute(insert(InventoryLog).values(log_rows))
+    
+    # 涉及的 (物料, 仓库) 的最终库存（含各批次）
+    keys = {(posting["material_id"], posting["warehouse"]) for posting in postings}
+    result = await db.execute(
+        select(StockBalance.material_id, StockBalance.warehouse, StockBalance.quantity)
+        .where(StockBalance.material_id.in_(material_ids))
+    )
+    balances = [
+        {"material_id": material_id, "warehouse": warehouse, "quantity": quantity}
+        for material_id, warehouse, quantity in result.all()
+        if (material_id, warehouse) in keys
+    ]
+    
+    await db.commit()
+    
+    return {
+        "message": "操作成功",
+        "lines": len(batch.lines),
+        "inventory": balances
     }
 
 
 @router.get("/logs")
 async def list_inventory_logs(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     material_id: int = None,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """获取库存操作日志"""
-    query = select(InventoryLog).order_by(InventoryLog.created_at.desc())
+    query = select(InventoryLog)
     
     if material_id:
         query = query.where(InventoryLog.material_id == material_id)
     
-    query = query.offset(skip).limit(limit)
+    query = paginate(
+        query, (InventoryLog.created_at, InventoryLog.id), skip, limit, cursor, descending=True
+    )
     result = await db.execute(query)
     logs = result.scalars().all()
     
-    return logs
+    return cursor_page(logs, limit, cursor, key=lambda log: (log.created_at, log.id))
+
+
+@router.post("/balances/reconcile")
+async def reconcile_stock_balances(
+    dry_run: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(check_permission("admin"))
+):
+    """由库存日志重建库存余额（对账）；dry_run 时只返回差异，不修改"""
+    result = await InventoryService(db).reconcile_balances(dry_run=dry_run)
+    await db.commit()
+    return result
 
 
 @router.get("/alerts")
@@ -131,24 +243,35 @@ async def inventory_alerts(
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """获取库存预警"""
-    # 查询库存低于安全线的物料
+    """获取库存预警（缓存快照，预警变化或预警物料库存变动提交后刷新）"""
+    cache_key = Cache.inventory_alerts_key()
+    
+    alerts = await cache.get(cache_key)
+    if alerts is not None:
+        return alerts
+    
+    # 生效中的预警由出入库时增量维护，这里只读取
     result = await db.execute(
-        select(Material, func.sum(Inventory.quantity).label("total_stock"))
-        .outerjoin(Inventory, Material.id == Inventory.material_id)
-        .group_by(Material.id)
-        .having(func.sum(Inventory.quantity) < Material.min_stock)
+        select(StockAlert.level, Material, func.coalesce(MaterialStock.quantity, 0))
+        .join(Material, Material.id == StockAlert.material_id)
+        .outerjoin(MaterialStock, MaterialStock.material_id == StockAlert.material_id)
+        .order_by(StockAlert.material_id)
     )
     
     alerts = []
-    for material, total_stock in result.all():
+    for level, material, total_stock in result.all():
+        threshold = material.min_stock if level == "critical" else material.safety_stock
         alerts.append({
             "material_id": material.id,
             "material_name": material.name,
             "material_code": material.code,
-            "current_stock": float(total_stock or 0),
-            "min_stock": float(material.min_stock),
-            "shortage": float(material.min_stock - (total_stock or 0))
+            "level": level,
+            "current_stock": float(total_stock),
+            "min_stock": float(material.min_stock or 0),
+            "safety_stock": float(material.safety_stock or 0),
+            "shortage": float((threshold or 0) - total_stock)
         })
     
+    await cache.set(cache_key, alerts, expire=settings.INVENTORY_ALERTS_TTL, tags=("stock_alerts", "materials"))
+    
     return alerts
@@ -2,53 +2,52 @@
 物料管理 API
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import List
+from sqlalchemy import select, or_
+from typing import Dict, List, Optional
 
+from app.config import settings
 from app.database import get_db
-from app.models import Material, MaterialCategory, Inventory
+from app.models import Material, MaterialCategory, StockBalance
+from app.services.stock_alert_service import StockAlertService
+from app.utils.query import paginate, cursor_page, MAX_PAGE_SIZE
+from app.utils.cache import Cache, cache, cached
 from app.utils.security import check_permission, get_current_user
 
 router = APIRouter()
 
 
-@router.get("")
-async def list_materials(
-    skip: int = 0,
-    limit: int = 100,
-    category_id: int = None,
-    keyword: str = None,
-    db: AsyncSession = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
-):
-    """获取物料列表"""
+def keyword_filter(keyword: str):
+    """名称 / 编码模糊匹配（PostgreSQL 下走 pg_trgm GIN 索引）"""
+    escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    pattern = f"%{escaped}%"
+    return or_(
+        Material.name.ilike(pattern, escape="\\"),
+        Material.code.ilike(pattern, escape="\\")
+    )
+
+
+@cached(expire=60, key_prefix="materials", tags=("materials",))
+async def material_rows(
+    skip: int,
+    limit: int,
+    category_id: Optional[int],
+    keyword: Optional[str],
+    cursor: Optional[str],
+    db: AsyncSession
+) -> List[dict]:
+    """物料列表一页（不含库存；物料提交后按标签失效）"""
     query = select(Material)
     
     if category_id:
         query = query.where(Material.cat_id == category_id)
     if keyword:
-        query = query.where(
-            Material.name.contains(keyword) | 
-            Material.code.contains(keyword)
-        )
+        query = query.where(keyword_filter(keyword))
     
-    query = query.offset(skip).limit(limit)
-    result = await db.execute(query)
-    materials = result.scalars().all()
-    
-    # 获取库存信息
-    material_list = []
-    for material in materials:
-        # 计算总库存
-        inventory_result = await db.execute(
-            select(func.sum(Inventory.quantity))
-            .where(Inventory.material_id == material.id)
-        )
-        total_stock = inventory_result.scalar() or 0
-        
-        material_dict = {
+    result = await db.execute(paginate(query, (Material.id,), skip, limit, cursor))
+    return [
+        {
             "id": material.id,
             "code": material.code,
             "name": material.name,
@@ -58,12 +57,77 @@ async def list_materials(
             "unit": material.unit,
             "supplier": material.supplier,
             "unit_cost": float(material.unit_cost) if material.unit_cost else None,
-            "min_stock": float(material.min_stock) if material.min_stock else 0,
-            "stock": float(total_stock)
+            "min_stock": float(material.min_stock) if material.min_stock else 0
         }
+        for material in result.scalars().all()
+    ]
+
+
+async def stock_summary(material_ids: List[int], db: AsyncSession) -> Dict[int, dict]:
+    """
+    物料库存汇总 {"total", "by_warehouse"}
+    
+    按物料缓存片段，一次 MGET 取回；未命中的物料从库存余额表一次查询补齐，
+    再经一个管道写回。库存变动提交后对应物料的片段按标签失效；
+    查询前取标签快照，查询期间被失效的物料不回写，避免旧库存写回缓存。
+    """
+    keys = {material_id: Cache.material_stock_key(material_id) for material_id in material_ids}
+    found = await cache.get_many(keys.values())
+    summary = {material_id: found[key] for material_id, key in keys.items() if key in found}
+    
+    missing = [material_id for material_id in material_ids if material_id not in summary]
+    if not missing:
+        return summary
+    
+    snapshot = await cache.tag_snapshot(*(f"material:{material_id}" for material_id in missing))
+    result = await db.execute(
+        select(StockBalance.material_id, StockBalance.warehouse, StockBalance.quantity)
+        .where(StockBalance.material_id.in_(missing))
+    )
+    fresh = {material_id: {"total": 0.0, "by_warehouse": {}} for material_id in missing}
+    for material_id, warehouse, quantity in result.all():
+        quantity = float(quantity or 0)
+        fresh[material_id]["by_warehouse"][warehouse] = quantity
+        fresh[material_id]["total"] += quantity
+    
+    async with cache.pipeline() as pipe:
+        for material_id, stock in fresh.items():
+            pipe.set(
+                keys[material_id],
+                stock,
+                expire=settings.MATERIAL_STOCK_TTL,
+                tags=(f"material:{material_id}",),
+                snapshot=snapshot
+            )
+    
+    summary.update(fresh)
+    return summary
+
+
+@router.get("")
+async def list_materials(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    category_id: int = None,
+    keyword: str = None,
+    by_warehouse: bool = False,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """获取物料列表"""
+    rows = await material_rows(skip, limit, category_id, keyword, cursor, db)
+    stock = await stock_summary([row["id"] for row in rows], db)
+    
+    material_list = []
+    for row in rows:
+        # 缓存中的对象可能被共享，复制后再补充库存
+        material_dict = dict(row, stock=stock[row["id"]]["total"])
+        if by_warehouse:
+            material_dict["stock_by_warehouse"] = stock[row["id"]]["by_warehouse"]
         material_list.append(material_dict)
     
-    return material_list
+    return cursor_page(material_list, limit, cursor, key=lambda material: (material["id"],))
 
 
 @router.post("")
@@ -113,6 +177,11 @@ async def update_material(
     for field, value in material_data.items():
         setattr(material, field, value)
     
+    # 阈值调整后按当前库存重新评估预警
+    if {"min_stock", "safety_stock"} & material_data.keys():
+        await db.flush()
+        await StockAlertService(db).evaluate([material_id])
+    
     await db.commit()
     await db.refresh(material)
     return material
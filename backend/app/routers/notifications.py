@@ -2,13 +2,14 @@
 通知 API
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.database import get_db
 from app.services.notification_service import NotificationService
 from app.utils.security import get_current_user
+from app.utils.query import MAX_PAGE_SIZE
 
 router = APIRouter()
 
@@ -16,7 +17,9 @@ router = APIRouter()
 @router.get("")
 async def list_notifications(
     is_read: Optional[bool] = None,
-    limit: int = 50,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -25,7 +28,9 @@ async def list_notifications(
     notifications = await service.get_user_notifications(
         user_id=current_user["id"],
         is_read=is_read,
-        limit=limit
+        skip=skip,
+        limit=limit,
+        cursor=cursor
     )
     return notifications
 
@@ -2,13 +2,14 @@
 采购管理 API
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
+from typing import List, Optional
 
 from app.database import get_db
 from app.models import ProcurementOrder
+from app.utils.query import paginate, cursor_page, MAX_PAGE_SIZE
 from app.utils.security import check_permission, get_current_user
 
 router = APIRouter()
@@ -16,10 +17,11 @@ router = APIRouter()
 
 @router.get("")
 async def list_procurement(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     status: str = None,
     project_id: int = None,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
@@ -31,11 +33,11 @@ async def list_procurement(
     if project_id:
         query = query.where(ProcurementOrder.project_id == project_id)
     
-    query = query.offset(skip).limit(limit)
+    query = paginate(query, (ProcurementOrder.id,), skip, limit, cursor)
     result = await db.execute(query)
     orders = result.scalars().all()
     
-    return orders
+    return cursor_page(orders, limit, cursor, key=lambda order: (order.id,))
 
 
 @router.post("")
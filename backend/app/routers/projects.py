@@ -2,47 +2,63 @@
 项目管理 API
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import List
+from sqlalchemy import select
+from datetime import date
+from typing import List, Optional, Union
 
 from app.database import get_db
-from app.models import Project, Task
+from app.models import Project
+from app.schemas.pagination import CursorPage
+from app.services.progress_service import task_stats_subquery, calc_progress, wbs_query, build_wbs
+from app.services.schedule_service import project_schedule, project_gantt, DependencyCycleError
 from app.schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse
+from app.utils import codec
+from app.utils.query import paginate, cursor_page, MAX_PAGE_SIZE
 from app.utils.security import check_permission, get_current_user
 
 router = APIRouter()
 
 
-@router.get("", response_model=List[ProjectResponse])
+@router.get("", response_model=Union[List[ProjectResponse], CursorPage[ProjectResponse]])
 async def list_projects(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     status: str = None,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """获取项目列表"""
-    query = select(Project)
+    page = select(Project.id)
     
     if status:
-        query = query.where(Project.status == status)
+        page = page.where(Project.status == status)
     
-    query = query.offset(skip).limit(limit)
+    page = paginate(page, (Project.id,), skip, limit, cursor).cte("project_page")
+    stats = task_stats_subquery(select(page.c.id))
+    
+    # 当前页项目与任务统计一次查询取回
+    query = (
+        select(
+            Project,
+            stats.c.total_tasks,
+            stats.c.completed_tasks,
+            stats.c.delayed_tasks,
+            stats.c.progress_sum,
+            stats.c.weighted_progress_sum,
+            stats.c.hours_sum
+        )
+        .join(page, page.c.id == Project.id)
+        .outerjoin(stats, stats.c.project_id == Project.id)
+        .order_by(Project.id)
+    )
     result = await db.execute(query)
-    projects = result.scalars().all()
     
-    # 计算统计信息
     project_list = []
-    for project in projects:
-        # 获取任务统计
-        tasks_result = await db.execute(
-            select(func.count(Task.id), func.sum(Task.progress_percent))
-            .where(Task.project_id == project.id)
-        )
-        task_count, total_progress = tasks_result.first()
-        
+    for (project, total_tasks, completed_tasks, delayed_tasks,
+         progress_sum, weighted_progress_sum, hours_sum) in result.all():
         project_dict = {
             "id": project.id,
             "project_no": project.project_no,
@@ -58,13 +74,16 @@ async def list_projects(
             "created_by": project.created_by,
             "created_at": project.created_at,
             "updated_at": project.updated_at,
-            "total_tasks": task_count or 0,
-            "completed_tasks": 0,  # TODO: 计算已完成任务数
-            "progress_percent": int((total_progress or 0) / (task_count or 1))
+            "total_tasks": total_tasks or 0,
+            "completed_tasks": completed_tasks or 0,
+            "delayed_tasks": delayed_tasks or 0,
+            "progress_percent": int(calc_progress(
+                total_tasks, progress_sum, weighted_progress_sum, hours_sum
+            ))
         }
         project_list.append(project_dict)
     
-    return project_list
+    return cursor_page(project_list, limit, cursor, key=lambda project: (project["id"],))
 
 
 @router.post("", response_model=ProjectResponse)
@@ -117,6 +136,95 @@ async def get_project(
     return project
 
 
+@router.get("/{project_id}/schedule")
+async def get_project_schedule(
+    project_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    项目进度计划（关键路径法）
+    
+    按任务依赖（FS / SS / FF / SF）计算各任务最早 / 最晚开始与完成、总浮动时间和关键路径；
+    结果缓存，项目任务或依赖变化提交后重新计算。
+    数千个任务的结果直接编码返回，不经过 jsonable_encoder 逐字段转换。
+    """
+    try:
+        schedule = await project_schedule(project_id, db)
+    except DependencyCycleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if schedule is None:
+        raise HTTPException(status_code=404, detail="项目不存在")
+    
+    return Response(content=codec.JSON.dumps(schedule), media_type="application/json")
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否命中 ETag（支持多个值、弱校验与 *）"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+@router.get("/{project_id}/gantt")
+async def get_project_gantt(
+    project_id: int,
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    项目甘特图数据（列式数组）
+    
+    只返回计划工期与 [start, end] 时间窗有交集的任务，日期为相对 base_date 的天数；
+    响应带 ETag，If-None-Match 命中时返回 304，数据随项目任务或依赖变化失效。
+    """
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="开始日期不能晚于结束日期")
+    
+    gantt = await project_gantt(project_id, start, end, db)
+    if gantt is None:
+        raise HTTPException(status_code=404, detail="项目不存在")
+    
+    headers = {"ETag": gantt["etag"], "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), gantt["etag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=gantt["body"], media_type="application/json", headers=headers)
+
+
+@router.get("/{project_id}/wbs")
+async def get_project_wbs(
+    project_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    项目工作分解结构（WBS 树）
+    
+    一条递归查询取回整个任务层级，返回嵌套节点；有子任务的节点进度由其下叶子任务
+    按计划工时加权汇总（未填写工时时为算术平均）。
+    """
+    result = await db.execute(wbs_query(project_id))
+    roots, total = build_wbs(result.all())
+    
+    if not roots:
+        result = await db.execute(select(Project.id).where(Project.id == project_id))
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="项目不存在")
+    
+    wbs = {
+        "project_id": project_id,
+        "total_tasks": total[0],
+        "progress_percent": round(calc_progress(*total), 2),
+        "nodes": roots
+    }
+    return Response(content=codec.JSON.dumps(wbs), media_type="application/json")
+
+
 @router.put("/{project_id}", response_model=ProjectResponse)
 async def update_project(
     project_id: int,
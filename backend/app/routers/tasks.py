@@ -2,23 +2,43 @@
 任务管理 API
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import select, delete, update, bindparam
+from typing import Dict, List, Optional, Tuple, Union
 
 from app.database import get_db
-from app.models import Task, Project
-from app.schemas.project import TaskCreate, TaskUpdate, TaskResponse, TaskWorkReport
+from app.models import Task, Project, User, TaskDependency
+from app.schemas.pagination import CursorPage
+from app.schemas.project import (
+    TaskCreate, TaskUpdate, TaskResponse, TaskWorkReport, TaskDependencyItem, TaskBatchUpdate, TaskBatchResult,
+    WorkReportBatch
+)
+from app.services.schedule_service import ScheduleService, DependencyCycleError
+from app.services.work_report_service import WorkReportService, ACCEPTED, DUPLICATE, NOT_FOUND
+from app.utils.cache import add_session_tags
+from app.utils.query import list_projection, row_to_dict, paginate, cursor_page, MAX_PAGE_SIZE
 from app.utils.security import check_permission, get_current_user
 
 router = APIRouter()
 
+# 影响预计日期的字段，修改后沿依赖向下游推算（进度决定在建任务的剩余工期）
+SCHEDULE_FIELDS = {"plan_start", "plan_end", "actual_start", "actual_end", "progress_percent"}
 
-@router.get("", response_model=List[TaskResponse])
+# 任务列表返回字段
+TASK_LIST_FIELDS = (
+    "id", "project_id", "task_no", "name", "task_type", "status", "priority",
+    "plan_start", "plan_end", "actual_start", "actual_end", "forecast_start", "forecast_end",
+    "forecast_delay_days", "planned_work_hours", "actual_work_hours", "progress_percent",
+    "delay_days", "delay_reason", "manager_id", "created_at", "updated_at"
+)
+
+
+@router.get("", response_model=Union[List[TaskResponse], CursorPage[TaskResponse]])
 async def list_tasks(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     project_id: int = None,
     status: str = None,
     manager_id: int = None,
@@ -26,7 +46,10 @@ async def list_tasks(
     current_user: dict = Depends(get_current_user)
 ):
     """获取任务列表"""
-    query = select(Task)
+    query = list_projection(
+        Task,
+        (Task.manager_id, User, "real_name", "manager_name")
+    )
     
     if project_id:
         query = query.where(Task.project_id == project_id)
@@ -35,38 +58,12 @@ async def list_tasks(
     if manager_id:
         query = query.where(Task.manager_id == manager_id)
     
-    query = query.offset(skip).limit(limit)
+    query = paginate(query, (Task.id,), skip, limit, cursor)
     result = await db.execute(query)
-    tasks = result.scalars().all()
     
     # 转换为响应格式
-    task_list = []
-    for task in tasks:
-        task_dict = {
-            "id": task.id,
-            "project_id": task.project_id,
-            "task_no": task.task_no,
-            "name": task.name,
-            "task_type": task.task_type,
-            "status": task.status,
-            "priority": task.priority,
-            "plan_start": task.plan_start,
-            "plan_end": task.plan_end,
-            "actual_start": task.actual_start,
-            "actual_end": task.actual_end,
-            "planned_work_hours": task.planned_work_hours,
-            "actual_work_hours": task.actual_work_hours,
-            "progress_percent": task.progress_percent,
-            "delay_days": task.delay_days,
-            "delay_reason": task.delay_reason,
-            "manager_id": task.manager_id,
-            "manager_name": task.manager.real_name if task.manager else None,
-            "created_at": task.created_at,
-            "updated_at": task.updated_at
-        }
-        task_list.append(task_dict)
-    
-    return task_list
+    task_list = [row_to_dict(row, TASK_LIST_FIELDS) for row in result.all()]
+    return cursor_page(task_list, limit, cursor, key=lambda task: (task["id"],))
 
 
 @router.post("", response_model=TaskResponse)
@@ -75,7 +72,16 @@ async def create_task(
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(check_permission("team_leader"))
 ):
-    """创建任务"""
+    """创建任务（dependencies 为前置任务 id，按完成-开始依赖写入 task_dependencies）"""
+    depends_on = set(task.dependencies or [])
+    if depends_on:
+        result = await db.execute(
+            select(Task.id).where(Task.id.in_(depends_on), Task.project_id == task.project_id)
+        )
+        missing = depends_on - set(result.scalars().all())
+        if missing:
+            raise HTTPException(status_code=400, detail=f"前置任务不存在: {sorted(missing)}")
+    
     db_task = Task(
         project_id=task.project_id,
         task_no=task.task_no,
@@ -85,12 +91,21 @@ async def create_task(
         priority=task.priority,
         plan_start=task.plan_start,
         plan_end=task.plan_end,
+        duration_days=task.duration_days,
         planned_work_hours=task.planned_work_hours,
         manager_id=task.manager_id,
         parent_id=task.parent_id
     )
     
     db.add(db_task)
+    await db.flush()
+    if depends_on:
+        db.add_all([
+            TaskDependency(task_id=db_task.id, depends_on_task_id=depends_on_task_id)
+            for depends_on_task_id in sorted(depends_on)
+        ])
+        await db.flush()
+    await ScheduleService(db).propagate(db_task.id)
     await db.commit()
     await db.refresh(db_task)
     
@@ -113,6 +128,74 @@ async def get_task(
     return task
 
 
+@router.put("/batch", response_model=TaskBatchResult)
+async def batch_update_tasks(
+    batch: TaskBatchUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(check_permission("team_leader"))
+):
+    """
+    批量更新任务（最多 500 个，同一事务）
+    
+    按 id 顺序锁定涉及的任务后逐行比对 version：不一致的行记为冲突、不修改，
+    其余行按修改字段分组，以 UPDATE ... WHERE id = ? AND version = ? 的 executemany 写入；
+    计划 / 实际日期有变化的任务合并为一次下游进度推算。
+    """
+    ids = [item.id for item in batch.items]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="任务 id 重复")
+    
+    result = await db.execute(
+        select(Task.id, Task.project_id, Task.version)
+        .where(Task.id.in_(ids))
+        .order_by(Task.id)
+        .with_for_update()
+    )
+    current = {row.id: row for row in result.all()}
+    
+    results = []
+    groups: Dict[Tuple[str, ...], List[dict]] = {}
+    scheduled = []
+    tags = set()
+    for item in batch.items:
+        row = current.get(item.id)
+        if row is None:
+            results.append({"id": item.id, "status": "not_found"})
+            continue
+        if item.version and item.version != row.version:
+            results.append({"id": item.id, "status": "conflict", "version": row.version})
+            continue
+        
+        update_data = item.dict(exclude_unset=True, exclude={"id", "version"})
+        groups.setdefault(tuple(sorted(update_data)), []).append(
+            {"task_id": row.id, "current_version": row.version, **update_data}
+        )
+        results.append({"id": item.id, "status": "updated", "version": row.version + 1})
+        tags.update((f"project:{row.project_id}", f"task:{row.id}"))
+        if SCHEDULE_FIELDS & update_data.keys():
+            scheduled.append(row.id)
+    
+    table = Task.__table__
+    for fields, params in groups.items():
+        await db.execute(
+            update(table)
+            .where(table.c.id == bindparam("task_id"), table.c.version == bindparam("current_version"))
+            .values(version=table.c.version + 1, **{field: bindparam(field) for field in fields}),
+            params
+        )
+    
+    # 日期变化时增量推算这些任务及其下游任务的预计日期
+    if scheduled:
+        await ScheduleService(db).propagate_many(scheduled)
+    
+    add_session_tags(db, *tags)
+    await db.commit()
+    
+    updated = sum(1 for row in results if row["status"] == "updated")
+    conflicts = sum(1 for row in results if row["status"] == "conflict")
+    return {"updated": updated, "conflicts": conflicts, "results": results}
+
+
 @router.put("/{task_id}", response_model=TaskResponse)
 async def update_task(
     task_id: int,
@@ -136,6 +219,11 @@ async def update_task(
         if field != "version":
             setattr(task, field, value)
     
+    # 日期 / 进度变化时增量推算本任务及下游任务的预计日期
+    if SCHEDULE_FIELDS & update_data.keys():
+        await db.flush()
+        await ScheduleService(db).propagate(task.id)
+    
     task.version += 1
     
     await db.commit()
@@ -144,6 +232,63 @@ async def update_task(
     return task
 
 
+@router.get("/{task_id}/dependencies", response_model=List[TaskDependencyItem])
+async def get_task_dependencies(
+    task_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """获取任务的前置依赖"""
+    result = await db.execute(
+        select(TaskDependency)
+        .where(TaskDependency.task_id == task_id)
+        .order_by(TaskDependency.depends_on_task_id)
+    )
+    return result.scalars().all()
+
+
+@router.put("/{task_id}/dependencies", response_model=List[TaskDependencyItem])
+async def set_task_dependencies(
+    task_id: int,
+    dependencies: List[TaskDependencyItem],
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(check_permission("team_leader"))
+):
+    """替换任务的前置依赖（前置任务须属于同一项目，不能形成循环）"""
+    result = await db.execute(select(Task.project_id).where(Task.id == task_id))
+    project_id = result.scalar_one_or_none()
+    
+    if project_id is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    items = {item.depends_on_task_id: item for item in dependencies}
+    if items:
+        result = await db.execute(
+            select(Task.id).where(Task.id.in_(items), Task.project_id == project_id)
+        )
+        missing = items.keys() - set(result.scalars().all())
+        if missing:
+            raise HTTPException(status_code=400, detail=f"前置任务不存在: {sorted(missing)}")
+    
+    edges = [(item.depends_on_task_id, task_id, item.dependency_type.value) for item in items.values()]
+    try:
+        await ScheduleService(db).check_dependencies(task_id, project_id, edges)
+    except DependencyCycleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    await db.execute(delete(TaskDependency).where(TaskDependency.task_id == task_id))
+    db.add_all([
+        TaskDependency(task_id=task_id, depends_on_task_id=pred, dependency_type=kind)
+        for pred, _, kind in sorted(edges)
+    ])
+    add_session_tags(db, f"project:{project_id}")
+    await db.flush()
+    await ScheduleService(db).propagate(task_id)
+    await db.commit()
+    
+    return [items[pred] for pred, _, _ in sorted(edges)]
+
+
 @router.post("/{task_id}/report")
 async def report_work(
     task_id: int,
@@ -151,30 +296,41 @@ async def report_work(
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """任务报工"""
-    result = await db.execute(select(Task).where(Task.id == task_id))
-    task = result.scalar_one_or_none()
+    """任务报工（写入报工流水，工时原子累加；同一 client_id 重复提交不重复累加）"""
+    statuses = await WorkReportService(db).record([{"task_id": task_id, **report.dict()}], current_user.get("id"))
     
-    if not task:
+    if statuses[0] == NOT_FOUND:
         raise HTTPException(status_code=404, detail="任务不存在")
     
-    # 更新实际工时和进度
-    task.actual_work_hours = (task.actual_work_hours or 0) + report.work_hours
-    task.progress_percent = report.progress_percent
+    await db.commit()
     
-    if report.progress_percent == 100:
-        task.status = "completed"
-        from datetime import datetime
-        task.actual_end = datetime.now()
-    elif report.progress_percent > 0:
-        task.status = "in_progress"
-        if not task.actual_start:
-            from datetime import datetime
-            task.actual_start = datetime.now()
+    return {"message": "报工成功"}
+
+
+@router.post("/reports/batch")
+async def report_work_batch(
+    batch: WorkReportBatch,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    批量同步报工（离线终端，最多 1000 条，同一事务）
     
+    每条返回 accepted / duplicate（client_id 已同步过）/ not_found（任务不存在）；
+    重试整批是安全的，已同步的报工不会重复累加工时。
+    """
+    reports = [report.dict() for report in batch.reports]
+    statuses = await WorkReportService(db).record(reports, current_user.get("id"))
     await db.commit()
     
-    return {"message": "报工成功"}
+    return {
+        "accepted": statuses.count(ACCEPTED),
+        "duplicates": statuses.count(DUPLICATE),
+        "results": [
+            {"task_id": report["task_id"], "client_id": report["client_id"], "status": status}
+            for report, status in zip(reports, statuses)
+        ]
+    }
 
 
 @router.delete("/{task_id}")
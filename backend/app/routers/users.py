@@ -2,7 +2,7 @@
 用户管理 API
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List
@@ -10,53 +10,44 @@ from typing import List
 from app.database import get_db
 from app.models import User, Department, Team
 from app.schemas.user import UserCreate, UserUpdate, UserResponse
+from app.utils.query import list_projection, row_to_dict, MAX_PAGE_SIZE
 from app.utils.security import get_password_hash, check_permission, get_current_user
 
 router = APIRouter()
 
+# 用户列表返回字段
+USER_LIST_FIELDS = (
+    "id", "username", "real_name", "phone", "email", "role",
+    "dept_id", "team_id", "is_active", "last_login_at", "created_at"
+)
+
 
 @router.get("", response_model=List[UserResponse])
 async def list_users(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     dept_id: int = None,
     role: str = None,
     db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(check_permission("admin"))
 ):
     """获取用户列表"""
-    query = select(User)
+    query = list_projection(
+        User,
+        (User.dept_id, Department, "name", "dept_name"),
+        (User.team_id, Team, "name", "team_name")
+    )
     
     if dept_id:
         query = query.where(User.dept_id == dept_id)
     if role:
         query = query.where(User.role == role)
     
-    query = query.offset(skip).limit(limit)
+    query = query.order_by(User.id).offset(skip).limit(limit)
     result = await db.execute(query)
-    users = result.scalars().all()
     
     # 转换为响应格式
-    user_list = []
-    for user in users:
-        user_dict = {
-            "id": user.id,
-            "username": user.username,
-            "real_name": user.real_name,
-            "phone": user.phone,
-            "email": user.email,
-            "role": user.role,
-            "dept_id": user.dept_id,
-            "team_id": user.team_id,
-            "dept_name": user.department.name if user.department else None,
-            "team_name": user.team.name if user.team else None,
-            "is_active": user.is_active,
-            "last_login_at": user.last_login_at,
-            "created_at": user.created_at
-        }
-        user_list.append(user_dict)
-    
-    return user_list
+    return [row_to_dict(row, USER_LIST_FIELDS) for row in result.all()]
 
 
 @router.post("", response_model=UserResponse)
@@ -0,0 +1,38 @@
+"""
+Pydantic 数据模型 - 库存
+"""
+
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from decimal import Decimal
+from enum import Enum
+
+
+class TransactionType(str, Enum):
+    IN = "in"
+    OUT = "out"
+    TRANSFER = "transfer"
+
+
+class AllocationStrategy(str, Enum):
+    """出库批次分配策略"""
+    FIFO = "fifo"  # 先入先出
+    FEFO = "fefo"  # 先到期先出（无有效期的批次按先入先出排在最后）
+
+
+class InventoryTransactionLine(BaseModel):
+    material_id: int
+    type: TransactionType
+    quantity: Decimal = Field(..., gt=0, max_digits=10, decimal_places=2)
+    warehouse: str = Field("main", min_length=1, max_length=50)
+    to_warehouse: Optional[str] = Field(None, max_length=50)  # 调拨目标仓库
+    location: Optional[str] = None
+    batch_no: Optional[str] = Field(None, max_length=50)  # 出库 / 调出时只扣该批次
+    strategy: AllocationStrategy = AllocationStrategy.FEFO  # 出库 / 调出的批次分配策略
+    related_task_id: Optional[int] = None
+    remark: Optional[str] = None
+
+
+class InventoryBatchTransaction(BaseModel):
+    lines: List[InventoryTransactionLine] = Field(..., min_length=1, max_length=500)
+    remark: Optional[str] = None
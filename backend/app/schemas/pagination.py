@@ -0,0 +1,14 @@
+"""
+Pydantic 数据模型 - 分页
+"""
+
+from pydantic import BaseModel
+from typing import Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class CursorPage(BaseModel, Generic[T]):
+    """游标分页结果"""
+    items: List[T]
+    next_cursor: Optional[str] = None
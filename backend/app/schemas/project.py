@@ -53,6 +53,7 @@ class ProjectResponse(ProjectBase):
     # 统计字段
     total_tasks: Optional[int] = 0
     completed_tasks: Optional[int] = 0
+    delayed_tasks: Optional[int] = 0
     progress_percent: Optional[int] = 0
     
     class Config:
@@ -116,6 +117,28 @@ class TaskUpdate(BaseModel):
     progress_percent: Optional[int] = Field(None, ge=0, le=100)
     delay_reason: Optional[str] = None
     manager_id: Optional[int] = None
+    version: Optional[int] = None  # 乐观锁：传入时须与当前版本一致
+
+
+class TaskBatchItem(TaskUpdate):
+    """批量更新中的单个任务修改"""
+    id: int
+
+
+class TaskBatchUpdate(BaseModel):
+    items: List[TaskBatchItem] = Field(..., min_length=1, max_length=500)
+
+
+class TaskBatchRowResult(BaseModel):
+    id: int
+    status: str  # updated, conflict, not_found
+    version: Optional[int] = None  # 更新后版本；冲突时为当前版本
+
+
+class TaskBatchResult(BaseModel):
+    updated: int
+    conflicts: int
+    results: List[TaskBatchRowResult]
 
 
 class TaskResponse(TaskBase):
@@ -124,6 +147,9 @@ class TaskResponse(TaskBase):
     actual_start: Optional[date] = None
     actual_end: Optional[date] = None
     actual_work_hours: int = 0
+    forecast_start: Optional[date] = None
+    forecast_end: Optional[date] = None
+    forecast_delay_days: int = 0
     delay_days: int = 0
     version: int = 1
     created_at: datetime
@@ -139,9 +165,36 @@ class TaskResponse(TaskBase):
         from_attributes = True
 
 
+class DependencyType(str, Enum):
+    FINISH_TO_START = "finish_to_start"
+    START_TO_START = "start_to_start"
+    FINISH_TO_FINISH = "finish_to_finish"
+    START_TO_FINISH = "start_to_finish"
+
+
+class TaskDependencyItem(BaseModel):
+    """前置任务依赖"""
+    depends_on_task_id: int
+    dependency_type: DependencyType = DependencyType.FINISH_TO_START
+    
+    class Config:
+        from_attributes = True
+
+
 class TaskWorkReport(BaseModel):
     """工时上报"""
     work_hours: int = Field(..., gt=0)
     progress_percent: int = Field(..., ge=0, le=100)
     remark: Optional[str] = None
     photo_urls: Optional[List[str]] = []
+    client_id: Optional[str] = Field(None, max_length=64)  # 终端生成的报工 id，重复提交不重复累加
+    reported_at: Optional[datetime] = None  # 终端报工时间，离线报工同步时传入
+
+
+class WorkReportItem(TaskWorkReport):
+    task_id: int
+
+
+class WorkReportBatch(BaseModel):
+    """离线终端批量同步报工"""
+    reports: List[WorkReportItem] = Field(..., min_length=1, max_length=1000)
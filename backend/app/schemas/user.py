@@ -47,6 +47,10 @@ class UserResponse(UserBase):
     last_login_at: Optional[datetime] = None
     created_at: datetime
     
+    # 关联信息
+    dept_name: Optional[str] = None
+    team_name: Optional[str] = None
+    
     class Config:
         from_attributes = True
 
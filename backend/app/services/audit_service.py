@@ -10,6 +10,7 @@ from sqlalchemy import select, func
 from fastapi import Request
 
 from app.models import AuditLog
+from app.utils.query import paginate, cursor_page
 
 
 class AuditService:
@@ -99,10 +100,11 @@ class AuditService:
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
         skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        cursor: Optional[str] = None
     ):
-        """获取审计日志"""
-        query = select(AuditLog).order_by(AuditLog.created_at.desc())
+        """获取审计日志（cursor 不为 None 时使用游标分页）"""
+        query = select(AuditLog)
         
         if user_id:
             query = query.where(AuditLog.user_id == user_id)
@@ -115,10 +117,14 @@ class AuditService:
         if end_date:
             query = query.where(AuditLog.created_at <= end_date)
         
-        query = query.offset(skip).limit(limit)
+        query = paginate(
+            query, (AuditLog.created_at, AuditLog.id), skip, limit, cursor, descending=True
+        )
         result = await self.db.execute(query)
         
-        return result.scalars().all()
+        return cursor_page(
+            result.scalars().all(), limit, cursor, key=lambda log: (log.created_at, log.id)
+        )
     
     async def get_user_activity_summary(
         self,
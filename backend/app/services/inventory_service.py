@@ -0,0 +1,463 @@
+"""
+库存服务
+出入库的并发安全实现：库存增减在数据库内以条件 UPDATE 原子完成，
+库存余额（stock_balances / material_stock）在同一事务内增量维护
+"""
+
+import heapq
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import bindparam, case, delete, func, insert, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Inventory, InventoryLog, StockBalance, MaterialStock
+from app.schemas.inventory import AllocationStrategy, InventoryTransactionLine, TransactionType
+from app.services.stock_alert_service import StockAlertService
+from app.utils.cache import add_session_tags
+from app.utils.query import upsert
+
+
+class InsufficientStockError(Exception):
+    """出库数量超过当前库存"""
+
+    def __init__(self, material_id: int, warehouse: str, line: Optional[int] = None):
+        super().__init__(f"库存不足: 物料 {material_id} / 仓库 {warehouse}")
+        self.material_id = material_id
+        self.warehouse = warehouse
+        self.line = line
+
+
+class BatchConflictError(Exception):
+    """批次号已在同一物料的其他仓库使用"""
+
+    def __init__(self, material_id: int, batch_no: str):
+        super().__init__(f"批次 {batch_no} 已存在于其他仓库")
+        self.material_id = material_id
+        self.batch_no = batch_no
+
+
+def allocate(
+    candidates: Iterable[Tuple],
+    quantity: Decimal
+) -> Optional[List[Tuple[int, Decimal, Decimal]]]:
+    """
+    按排序键贪心分配出库数量，返回 [(库存记录 id, 可用数量, 扣减数量)]；库存不足返回 None
+
+    候选为 (排序键..., 库存记录 id, 可用数量) 元组。只取出实际消耗的批次：
+    heapify O(n) + 每个消耗批次 O(log n)，数千个批次的物料也无需整体排序。
+    """
+    heap = list(candidates)
+    heapq.heapify(heap)
+    allocations = []
+    remaining = quantity
+    while remaining > 0 and heap:
+        *_, inventory_id, available = heapq.heappop(heap)
+        take = min(available, remaining)
+        allocations.append((inventory_id, available, take))
+        remaining -= take
+    if remaining > 0:
+        return None
+    return allocations
+
+
+def allocation_candidates(
+    rows: Iterable[Any],
+    strategy: AllocationStrategy,
+    available: Optional[Dict[int, Decimal]] = None
+) -> List[Tuple]:
+    """
+    由库存行（id, batch_no, expiry_date, created_at, quantity）生成 allocate 的候选元组
+
+    非批次库存行排在最后；FEFO 先按有效期（无有效期的排后）、再按入库时间排序，FIFO 只按入库时间。
+    available 为库存记录 id -> 当前数量（批量操作回放中的数量），缺省取行内数量；数量为 0 的行不参与分配。
+    """
+    candidates = []
+    for row in rows:
+        quantity = row.quantity if available is None else available[row.id]
+        if not quantity or quantity <= 0:
+            continue
+        key: Tuple = (row.batch_no is None,)
+        if strategy == AllocationStrategy.FEFO:
+            key += (row.expiry_date is None, row.expiry_date or datetime.min)
+        candidates.append((*key, row.created_at or datetime.min, row.id, quantity))
+    return candidates
+
+
+class InventoryService:
+    """
+    库存服务
+
+    非批次库存行（batch_no 为空，每个物料 + 仓库唯一）与批次库存行：
+    - 入库先 INSERT … ON CONFLICT DO NOTHING 确保行存在，不会产生重复行
+    - 增减为 UPDATE … SET quantity = quantity ± n RETURNING，
+      出库条件 quantity >= n 与扣减在同一语句内完成
+    - 出库（单笔与批量）按 FIFO / FEFO 在质检合格的批次间分配，候选行 SELECT … FOR UPDATE 锁定，
+      各批次的扣减同样带 quantity >= n 条件，不依赖数据库支持行锁
+    行锁持有到事务提交，并发出库按行串行，不会丢失更新或扣成负数。
+
+    加锁顺序固定为：库存行 → stock_balances → material_stock，各自按主键排序，
+    单笔与批量操作并发时不会死锁。
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _ensure_row(self, material_id: int, warehouse: str, location: Optional[str]):
+        """确保非批次库存行存在（并发创建由唯一索引去重）"""
+        await self.db.execute(
+            upsert(self.db, Inventory)
+            .values(material_id=material_id, warehouse=warehouse, location=location, quantity=0)
+            .on_conflict_do_nothing(
+                index_elements=[Inventory.material_id, Inventory.warehouse],
+                index_where=Inventory.batch_no.is_(None)
+            )
+        )
+
+    async def _ensure_batch(
+        self,
+        material_id: int,
+        warehouse: str,
+        batch_no: str,
+        location: Optional[str],
+        qc_status: Optional[str],
+        expiry_date: Optional[datetime]
+    ):
+        """确保批次库存行存在；质检状态、有效期只在首次入库时写入"""
+        await self.db.execute(
+            upsert(self.db, Inventory)
+            .values(
+                material_id=material_id,
+                batch_no=batch_no,
+                warehouse=warehouse,
+                location=location,
+                quantity=0,
+                qc_status=qc_status or "pending",
+                expiry_date=expiry_date
+            )
+            .on_conflict_do_nothing(index_elements=[Inventory.material_id, Inventory.batch_no])
+        )
+
+    async def _update_quantity(
+        self,
+        material_id: int,
+        warehouse: str,
+        delta: Decimal,
+        batch_no: Optional[str] = None
+    ) -> Optional[Tuple[int, Decimal]]:
+        """quantity += delta，返回 (库存记录 id, 变动后数量)；扣减时库存不足返回 None"""
+        stmt = (
+            update(Inventory)
+            .where(
+                Inventory.material_id == material_id,
+                Inventory.warehouse == warehouse,
+                Inventory.batch_no == batch_no if batch_no else Inventory.batch_no.is_(None)
+            )
+            .values(quantity=Inventory.quantity + delta)
+            .returning(Inventory.id, Inventory.quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if delta < 0:
+            stmt = stmt.where(Inventory.quantity >= -delta)
+        return (await self.db.execute(stmt)).one_or_none()
+
+    async def _post_balances(self, deltas: Dict[Tuple[int, str], Decimal]):
+        """
+        按 (物料, 仓库) 净变动累加库存余额与物料总库存，各一条多行 upsert，
+        再评估总库存有变动的物料是否跨越预警阈值（仓库间调拨不触发）
+        """
+        now = datetime.utcnow()
+        material_deltas: Dict[int, Decimal] = defaultdict(Decimal)
+        for (material_id, _), delta in deltas.items():
+            material_deltas[material_id] += delta
+
+        stmt = upsert(self.db, StockBalance).values([
+            {"material_id": material_id, "warehouse": warehouse, "quantity": delta, "updated_at": now}
+            for (material_id, warehouse), delta in sorted(deltas.items())
+        ])
+        await self.db.execute(stmt.on_conflict_do_update(
+            index_elements=[StockBalance.material_id, StockBalance.warehouse],
+            set_={"quantity": StockBalance.quantity + stmt.excluded.quantity, "updated_at": now}
+        ))
+
+        stmt = upsert(self.db, MaterialStock).values([
+            {"material_id": material_id, "quantity": delta, "updated_at": now}
+            for material_id, delta in sorted(material_deltas.items())
+        ])
+        await self.db.execute(stmt.on_conflict_do_update(
+            index_elements=[MaterialStock.material_id],
+            set_={"quantity": MaterialStock.quantity + stmt.excluded.quantity, "updated_at": now}
+        ))
+
+        await StockAlertService(self.db).evaluate(
+            material_id for material_id, delta in material_deltas.items() if delta
+        )
+
+    async def _lock_rows(self, material_id: int, warehouse: str, batch_no: Optional[str] = None) -> List[Any]:
+        """
+        锁定可出库的库存行（id, batch_no, expiry_date, created_at, quantity）
+
+        指定批次号时只取该批次；否则取非批次库存行与质检合格的批次，批次只取有库存的。
+        按 id 顺序加锁，与分配顺序无关，不同策略的并发出库不会死锁。
+        """
+        passed = (Inventory.qc_status == "pass") & (Inventory.quantity > 0)
+        result = await self.db.execute(
+            select(Inventory.id, Inventory.batch_no, Inventory.expiry_date, Inventory.created_at, Inventory.quantity)
+            .where(
+                Inventory.material_id == material_id,
+                Inventory.warehouse == warehouse,
+                (Inventory.batch_no == batch_no) & passed if batch_no else or_(Inventory.batch_no.is_(None), passed)
+            )
+            .order_by(Inventory.id)
+            .with_for_update()
+        )
+        return result.all()
+
+    async def _lock_candidates(
+        self,
+        material_id: int,
+        warehouse: str,
+        batch_no: Optional[str],
+        strategy: AllocationStrategy
+    ) -> Tuple[List[Tuple], Dict[int, Optional[str]]]:
+        """锁定可出库的库存行，返回 (allocate 的候选元组, 库存记录 id -> 批次号)"""
+        rows = await self._lock_rows(material_id, warehouse, batch_no)
+        return allocation_candidates(rows, strategy), {row.id: row.batch_no for row in rows}
+
+    async def _issue(
+        self,
+        material_id: int,
+        warehouse: str,
+        quantity: Decimal,
+        batch_no: Optional[str],
+        strategy: AllocationStrategy
+    ) -> List[Dict[str, Any]]:
+        """按分配结果扣减各库存行（一条 executemany UPDATE）"""
+        candidates, batch_nos = await self._lock_candidates(material_id, warehouse, batch_no, strategy)
+        allocations = allocate(candidates, quantity)
+        if allocations is None:
+            raise InsufficientStockError(material_id, warehouse)
+
+        # 条件扣减：行锁之外再以 quantity >= take 兜底（SQLite 不支持 FOR UPDATE），
+        # 任一行不满足即整体失败，由调用方回滚事务
+        table = Inventory.__table__
+        result = await self.db.execute(
+            update(table)
+            .where(table.c.id == bindparam("inventory_id"), table.c.quantity >= bindparam("take"))
+            .values(quantity=table.c.quantity - bindparam("take"), updated_at=datetime.utcnow()),
+            [{"inventory_id": inventory_id, "take": take} for inventory_id, _, take in allocations]
+        )
+        # asyncpg 的 executemany 不返回可靠的 rowcount，此时由 FOR UPDATE 行锁保证
+        counted = len(allocations) == 1 or result.supports_sane_multi_rowcount()
+        if counted and result.rowcount != len(allocations):
+            raise InsufficientStockError(material_id, warehouse)
+        return [
+            {
+                "inventory_id": inventory_id,
+                "batch_no": batch_nos[inventory_id],
+                "quantity": take,
+                "before_qty": available,
+                "after_qty": available - take
+            }
+            for inventory_id, available, take in allocations
+        ]
+
+    async def apply(
+        self,
+        material_id: int,
+        warehouse: str,
+        type: str,
+        quantity: Decimal,
+        location: Optional[str] = None,
+        batch_no: Optional[str] = None,
+        qc_status: Optional[str] = None,
+        expiry_date: Optional[datetime] = None,
+        strategy: AllocationStrategy = AllocationStrategy.FEFO
+    ) -> List[Dict[str, Any]]:
+        """
+        入库 / 出库，返回每个库存行的变动（inventory_id, batch_no, quantity, before_qty, after_qty）
+
+        入库指定批次号时记入该批次，否则记入非批次库存行；
+        出库指定批次号时只扣该批次，否则按 strategy 分配到多个批次，每个批次一条变动。
+        库存不足时抛出 InsufficientStockError，批次号已用于其他仓库时抛出 BatchConflictError；
+        调用方负责提交事务。
+        """
+        add_session_tags(self.db, f"material:{material_id}")
+
+        if type == "in":
+            if batch_no:
+                await self._ensure_batch(material_id, warehouse, batch_no, location, qc_status, expiry_date)
+            else:
+                await self._ensure_row(material_id, warehouse, location)
+            row = await self._update_quantity(material_id, warehouse, quantity, batch_no)
+            if row is None:
+                raise BatchConflictError(material_id, batch_no)
+            inventory_id, after_qty = row
+            postings = [{
+                "inventory_id": inventory_id,
+                "batch_no": batch_no,
+                "quantity": quantity,
+                "before_qty": after_qty - quantity,
+                "after_qty": after_qty
+            }]
+            delta = quantity
+        else:
+            postings = await self._issue(material_id, warehouse, quantity, batch_no, strategy)
+            delta = -quantity
+
+        await self._post_balances({(material_id, warehouse): delta})
+        return postings
+
+    async def apply_lines(self, lines: Sequence[InventoryTransactionLine]) -> List[Dict[str, Any]]:
+        """
+        批量入库 / 出库 / 调拨，返回每笔库存变动（调拨拆为调出、调入两笔，出库每个消耗的批次一笔）
+
+        入库、调入记入非批次库存行；出库、调出与 apply 相同，按行的 strategy 在质检合格的批次间
+        分配，指定 batch_no 时只扣该批次。
+
+        先按 (物料, 仓库) 排序逐个锁定涉及的库存行（行内按 id），并发的批量操作加锁顺序一致，
+        不会互相死锁；再按行顺序在内存中回放分配，得到每笔变动前后的数量，任一行库存不足即失败；
+        最后以一条 executemany UPDATE 写回各库存行的净变动。
+        调用方负责提交事务；抛出异常时应整体回滚。
+        """
+        # (行号, 行, 仓库, 变动量, 库位)
+        postings: List[Tuple[int, InventoryTransactionLine, str, Decimal, Optional[str]]] = []
+        for index, line in enumerate(lines, start=1):
+            if line.type == TransactionType.TRANSFER:
+                postings.append((index, line, line.warehouse, -line.quantity, None))
+                postings.append((index, line, line.to_warehouse, line.quantity, line.location))
+            elif line.type == TransactionType.IN:
+                postings.append((index, line, line.warehouse, line.quantity, line.location))
+            else:
+                postings.append((index, line, line.warehouse, -line.quantity, None))
+
+        net: Dict[Tuple[int, str], Decimal] = defaultdict(Decimal)
+        receive_locations: Dict[Tuple[int, str], Optional[str]] = {}
+        for _, line, warehouse, delta, location in postings:
+            key = (line.material_id, warehouse)
+            net[key] += delta
+            if delta > 0:
+                receive_locations.setdefault(key, location)
+        add_session_tags(self.db, *{f"material:{material_id}" for material_id, _ in net})
+
+        rows: Dict[Tuple[int, str], List[Any]] = {}
+        for key in sorted(net):
+            if key in receive_locations:
+                await self._ensure_row(*key, receive_locations[key])
+            rows[key] = await self._lock_rows(*key)
+        quantities = {row.id: row.quantity or Decimal(0) for key_rows in rows.values() for row in key_rows}
+        batch_nos = {row.id: row.batch_no for key_rows in rows.values() for row in key_rows}
+
+        results = []
+        changes: Dict[int, Decimal] = defaultdict(Decimal)
+        for index, line, warehouse, delta, _ in postings:
+            key = (line.material_id, warehouse)
+            if delta > 0:
+                moves = [(next(row.id for row in rows[key] if row.batch_no is None), delta)]
+            else:
+                candidates = allocation_candidates(
+                    (row for row in rows[key] if not line.batch_no or row.batch_no == line.batch_no),
+                    line.strategy,
+                    quantities
+                )
+                allocations = allocate(candidates, -delta)
+                if allocations is None:
+                    raise InsufficientStockError(*key, line=index)
+                moves = [(inventory_id, -take) for inventory_id, _, take in allocations]
+            for inventory_id, change in moves:
+                before_qty = quantities[inventory_id]
+                quantities[inventory_id] = before_qty + change
+                changes[inventory_id] += change
+                results.append({
+                    "line": index,
+                    "material_id": line.material_id,
+                    "warehouse": warehouse,
+                    "inventory_id": inventory_id,
+                    "batch_no": batch_nos[inventory_id],
+                    "quantity": abs(change),
+                    "before_qty": before_qty,
+                    "after_qty": before_qty + change
+                })
+
+        # 条件更新兜底（SQLite 不支持 FOR UPDATE），同 _issue；此时无法确定是哪一行，不带行号
+        params = [{"inventory_id": inventory_id, "delta": delta} for inventory_id, delta in sorted(changes.items()) if delta]
+        if params:
+            table = Inventory.__table__
+            result = await self.db.execute(
+                update(table)
+                .where(table.c.id == bindparam("inventory_id"), table.c.quantity + bindparam("delta") >= 0)
+                .values(quantity=table.c.quantity + bindparam("delta"), updated_at=datetime.utcnow()),
+                params
+            )
+            counted = len(params) == 1 or result.supports_sane_multi_rowcount()
+            if counted and result.rowcount != len(params):
+                raise InsufficientStockError(*min(net))
+        await self._post_balances(net)
+        return results
+
+    async def reconcile_balances(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        由 inventory_logs 重建库存余额，返回与现有余额不一致的条目
+
+        非 dry_run 时：存在差异则重建两张余额表，并按对账后的余额全量校正预警状态。
+
+        每条日志的变动量为 after_qty - before_qty（缺失时按类型取 ±quantity），
+        仓库取自日志关联的库存行。PostgreSQL 下先锁住余额表，
+        等待进行中的出入库提交，重建期间新的出入库排队等待。
+        """
+        if self.db.bind.dialect.name == "postgresql":
+            await self.db.execute(text("LOCK TABLE stock_balances, material_stock IN EXCLUSIVE MODE"))
+
+        delta = func.coalesce(
+            InventoryLog.after_qty - InventoryLog.before_qty,
+            case((InventoryLog.type == "out", -InventoryLog.quantity), else_=InventoryLog.quantity)
+        )
+        result = await self.db.execute(
+            select(InventoryLog.material_id, Inventory.warehouse, func.sum(delta))
+            .join(Inventory, Inventory.id == InventoryLog.inventory_id)
+            .group_by(InventoryLog.material_id, Inventory.warehouse)
+        )
+        expected = {(material_id, warehouse): quantity or Decimal(0) for material_id, warehouse, quantity in result.all()}
+
+        expected_totals: Dict[int, Decimal] = defaultdict(Decimal)
+        for (material_id, _), quantity in expected.items():
+            expected_totals[material_id] += quantity
+
+        result = await self.db.execute(select(StockBalance.material_id, StockBalance.warehouse, StockBalance.quantity))
+        actual = {(material_id, warehouse): quantity for material_id, warehouse, quantity in result.all()}
+        result = await self.db.execute(select(MaterialStock.material_id, MaterialStock.quantity))
+        actual_totals = dict(result.all())
+
+        # 物料总库存的差异以 warehouse 为 None 表示
+        zero = Decimal(0)
+        mismatches = [
+            {"material_id": key[0], "warehouse": key[1], "expected": expected.get(key, zero), "actual": actual.get(key, zero)}
+            for key in sorted(expected.keys() | actual.keys())
+            if expected.get(key, zero) != actual.get(key, zero)
+        ] + [
+            {"material_id": material_id, "warehouse": None, "expected": expected_totals.get(material_id, zero), "actual": actual_totals.get(material_id, zero)}
+            for material_id in sorted(expected_totals.keys() | actual_totals.keys())
+            if expected_totals.get(material_id, zero) != actual_totals.get(material_id, zero)
+        ]
+
+        if mismatches and not dry_run:
+            await self.db.execute(delete(StockBalance))
+            await self.db.execute(delete(MaterialStock))
+            if expected:
+                now = datetime.utcnow()
+                await self.db.execute(insert(StockBalance).values([
+                    {"material_id": material_id, "warehouse": warehouse, "quantity": quantity, "updated_at": now}
+                    for (material_id, warehouse), quantity in sorted(expected.items())
+                ]))
+                await self.db.execute(insert(MaterialStock).values([
+                    {"material_id": material_id, "quantity": quantity, "updated_at": now}
+                    for material_id, quantity in sorted(expected_totals.items())
+                ]))
+            add_session_tags(self.db, *{f"material:{m['material_id']}" for m in mismatches})
+
+        if not dry_run:
+            # 按对账后的余额全量校正预警状态（不补发通知）
+            await StockAlertService(self.db).evaluate(notify=False)
+
+        return {"checked": len(expected.keys() | actual.keys()), "mismatches": mismatches}
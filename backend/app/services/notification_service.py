@@ -3,13 +3,14 @@
 支持多种通知渠道
 """
 
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, insert
 
 from app.models import Notification, User
-from app.utils.cache import cache
+from app.utils.cache import add_session_tags, cache
+from app.utils.query import paginate, cursor_page
 
 
 class NotificationService:
@@ -26,9 +27,10 @@ class NotificationService:
         type: str = "info",
         category: str = "system",
         related_type: Optional[str] = None,
-        related_id: Optional[int] = None
+        related_id: Optional[int] = None,
+        commit: bool = True
     ) -> Notification:
-        """创建通知"""
+        """创建通知（commit=False 时随调用方的事务一起提交，提交后未读数缓存按标签失效）"""
         notification = Notification(
             user_id=user_id,
             title=title,
@@ -42,6 +44,9 @@ class NotificationService:
         )
         
         self.db.add(notification)
+        if not commit:
+            return notification
+        
         await self.db.commit()
         await self.db.refresh(notification)
         
@@ -50,22 +55,49 @@ class NotificationService:
         
         return notification
     
+    async def create_notifications(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        批量创建通知（一条多行 INSERT），返回创建条数
+
+        不提交事务，由调用方随业务数据一起提交；提交后相关用户的未读数缓存失效。
+        """
+        if not rows:
+            return 0
+        
+        defaults = {
+            "type": "info",
+            "category": "system",
+            "related_type": None,
+            "related_id": None,
+            "is_read": False,
+            "pushed": False
+        }
+        await self.db.execute(insert(Notification).values([{**defaults, **row} for row in rows]))
+        add_session_tags(self.db, *{f"notifications:{row['user_id']}" for row in rows})
+        return len(rows)
+    
     async def get_user_notifications(
         self,
         user_id: int,
         is_read: Optional[bool] = None,
-        limit: int = 50
-    ) -> List[Notification]:
-        """获取用户通知"""
+        skip: int = 0,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ):
+        """获取用户通知（cursor 不为 None 时使用游标分页）"""
         query = select(Notification).where(Notification.user_id == user_id)
         
         if is_read is not None:
             query = query.where(Notification.is_read == is_read)
         
-        query = query.order_by(Notification.created_at.desc()).limit(limit)
+        query = paginate(
+            query, (Notification.created_at, Notification.id), skip, limit, cursor, descending=True
+        )
         result = await self.db.execute(query)
         
-        return result.scalars().all()
+        return cursor_page(
+            result.scalars().all(), limit, cursor, key=lambda n: (n.created_at, n.id)
+        )
     
     async def get_unread_count(self, user_id: int) -> int:
         """获取未读通知数量"""
@@ -88,7 +120,7 @@ class NotificationService:
         count = len(result.scalars().all())
         
         # 缓存结果（5分钟）
-        await cache.set(cache_key, count, expire=300)
+        await cache.set(cache_key, count, expire=300, tags=(f"notifications:{user_id}",))
         
         return count
     
@@ -185,7 +217,8 @@ class NotificationService:
         user_id: int,
         task_name: str,
         delay_days: int,
-        task_id: int
+        task_id: int,
+        commit: bool = True
     ):
         """任务延期通知"""
         await self.create_notification(
@@ -195,7 +228,8 @@ class NotificationService:
             type="warning",
             category="task",
             related_type="task",
-            related_id=task_id
+            related_id=task_id,
+            commit=commit
         )
     
     async def notify_procurement_approved(
@@ -215,6 +249,29 @@ class NotificationService:
             related_id=order_id
         )
     
+    @staticmethod
+    def _inventory_alert_message(
+        material_name: str,
+        current_stock: float,
+        min_stock: Optional[float],
+        level: str = "critical",
+        safety_stock: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """库存预警通知内容：critical 为低于最低库存，warning 为低于安全库存"""
+        if level == "critical":
+            return {
+                "title": "库存预警",
+                "content": f"物料「{material_name}」库存不足（当前：{float(current_stock)}，最低：{float(min_stock)}）",
+                "type": "error",
+                "category": "inventory"
+            }
+        return {
+            "title": "库存预警",
+            "content": f"物料「{material_name}」低于安全库存（当前：{float(current_stock)}，安全库存：{float(safety_stock)}）",
+            "type": "warning",
+            "category": "inventory"
+        }
+    
     async def notify_inventory_alert(
         self,
         user_id: int,
@@ -225,12 +282,33 @@ class NotificationService:
         """库存预警通知"""
         await self.create_notification(
             user_id=user_id,
-            title="库存预警",
-            content=f"物料「{material_name}」库存不足（当前：{current_stock}，最低：{min_stock}）",
-            type="error",
-            category="inventory"
+            **self._inventory_alert_message(material_name, current_stock, min_stock)
         )
     
+    async def notify_inventory_alerts(self, alerts: List[Dict[str, Any]], user_ids: List[int]) -> int:
+        """
+        库存预警批量通知：每条预警通知每个接收人（一条多行 INSERT），返回创建条数
+
+        alerts 每项含 material_id、material_name、level、current_stock、min_stock、safety_stock；
+        不提交事务，由调用方随库存变动一起提交。
+        """
+        rows = []
+        for alert in alerts:
+            message = self._inventory_alert_message(
+                alert["material_name"],
+                alert["current_stock"],
+                alert["min_stock"],
+                level=alert["level"],
+                safety_stock=alert["safety_stock"]
+            )
+            rows.extend({
+                "user_id": user_id,
+                **message,
+                "related_type": "material",
+                "related_id": alert["material_id"]
+            } for user_id in user_ids)
+        return await self.create_notifications(rows)
+    
     async def notify_work_report_reminder(self, user_id: int):
         """报工提醒"""
         await self.create_notification(
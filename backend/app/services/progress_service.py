@@ -0,0 +1,116 @@
+"""
+项目进度统计
+按项目聚合任务数量与进度，WBS 树按计划工时汇总父任务进度
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select, func, case, or_, literal
+
+from app.models import Task
+
+
+def task_stats_subquery(project_ids):
+    """按项目聚合任务统计（总数 / 已完成 / 延期 / 进度加权和）"""
+    hours = func.coalesce(Task.planned_work_hours, 0)
+    progress = func.coalesce(Task.progress_percent, 0)
+
+    return (
+        select(
+            Task.project_id.label("project_id"),
+            func.count(Task.id).label("total_tasks"),
+            func.sum(case((Task.status == "completed", 1), else_=0)).label("completed_tasks"),
+            func.sum(case(
+                (or_(Task.status == "delayed", Task.delay_days > 0, Task.forecast_delay_days > 0), 1),
+                else_=0
+            )).label("delayed_tasks"),
+            func.sum(progress).label("progress_sum"),
+            func.sum(progress * hours).label("weighted_progress_sum"),
+            func.sum(hours).label("hours_sum")
+        )
+        .where(Task.project_id.in_(project_ids))
+        .group_by(Task.project_id)
+        .subquery()
+    )
+
+
+def calc_progress(
+    total_tasks,
+    progress_sum,
+    weighted_progress_sum,
+    hours_sum,
+    weighted: bool = True
+) -> float:
+    """项目进度：按计划工时加权，未填写工时（或 weighted=False）时为算术平均"""
+    if weighted and hours_sum:
+        return float(weighted_progress_sum) / float(hours_sum)
+    if total_tasks:
+        return float(progress_sum or 0) / total_tasks
+    return 0.0
+
+
+def wbs_query(project_id: int):
+    """项目 WBS：递归 CTE 从顶层任务（无父任务）逐层展开，按层级、id 排序"""
+    tree = (
+        select(Task.id, literal(1).label("depth"))
+        .where(Task.project_id == project_id, Task.parent_id.is_(None))
+        .cte("wbs", recursive=True)
+    )
+    tree = tree.union_all(
+        select(Task.id, (tree.c.depth + 1).label("depth"))
+        .join(tree, Task.parent_id == tree.c.id)
+        .where(Task.project_id == project_id)
+    )
+    return (
+        select(
+            Task.id, Task.parent_id, Task.task_no, Task.name, Task.status, Task.level,
+            Task.plan_start, Task.plan_end, Task.planned_work_hours, Task.progress_percent,
+            tree.c.depth
+        )
+        .join(tree, tree.c.id == Task.id)
+        .order_by(tree.c.depth, Task.id)
+    )
+
+
+def build_wbs(rows) -> Tuple[List[Dict[str, Any]], List[float]]:
+    """
+    按层级有序的 WBS 行组装嵌套节点，并汇总父任务进度
+
+    逆序一次遍历（子节点先于父节点）累加叶子任务的 [任务数, 进度和, 加权进度和, 工时和]，
+    父任务进度按 calc_progress 由其下全部叶子任务计算（按计划工时加权）。
+    返回顶层节点列表与整棵树的汇总值。
+    """
+    nodes: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]] = []
+    by_id: Dict[int, Dict[str, Any]] = {}
+    roots: List[Dict[str, Any]] = []
+    for row in rows:
+        node = {
+            "id": row.id,
+            "task_no": row.task_no,
+            "name": row.name,
+            "status": row.status,
+            "level": row.level,
+            "plan_start": row.plan_start,
+            "plan_end": row.plan_end,
+            "planned_work_hours": row.planned_work_hours,
+            "progress_percent": float(row.progress_percent or 0),
+            "children": []
+        }
+        parent = by_id.get(row.parent_id)
+        (parent["children"] if parent else roots).append(node)
+        by_id[row.id] = node
+        nodes.append((node, parent))
+
+    stats: Dict[int, List[float]] = {}
+    total = [0, 0.0, 0.0, 0.0]
+    for node, parent in reversed(nodes):
+        acc = stats.pop(node["id"], None)
+        if acc is None:
+            hours = float(node["planned_work_hours"] or 0)
+            progress = node["progress_percent"]
+            acc = [1, progress, progress * hours, hours]
+        else:
+            node["progress_percent"] = round(calc_progress(*acc), 2)
+        target = stats.setdefault(parent["id"], [0, 0.0, 0.0, 0.0]) if parent else total
+        for i, value in enumerate(acc):
+            target[i] += value
+    return roots, total
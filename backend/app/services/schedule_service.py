@@ -0,0 +1,483 @@
+"""
+项目进度计划（关键路径法）
+由 task_dependencies 构建项目任务 DAG，一次拓扑排序完成正推 / 逆推，O(V+E)；
+任务进度变化时只沿下游子图增量推算预计日期与预计延期天数
+"""
+
+import hashlib
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import Project, Task, TaskDependency
+from app.services.notification_service import NotificationService
+from app.utils import codec
+from app.utils.cache import add_session_tags, cached
+
+logger = logging.getLogger(__name__)
+
+FINISH_TO_START = "finish_to_start"
+START_TO_START = "start_to_start"
+FINISH_TO_FINISH = "finish_to_finish"
+START_TO_FINISH = "start_to_finish"
+DEPENDENCY_TYPES = (FINISH_TO_START, START_TO_START, FINISH_TO_FINISH, START_TO_FINISH)
+
+# 依赖边 (前置任务 id, 后续任务 id, 依赖类型)
+Edge = Tuple[int, int, str]
+
+
+class DependencyCycleError(Exception):
+    """任务依赖存在循环，cycle 为按依赖方向排列的任务 id"""
+
+    def __init__(self, cycle: List[int]):
+        super().__init__("任务依赖存在循环: " + " → ".join(str(task_id) for task_id in cycle))
+        self.cycle = cycle
+
+
+def topological_order(
+    task_ids: Iterable[int],
+    edges: Iterable[Edge]
+) -> Tuple[List[int], Dict[int, List[Tuple[int, str]]], Dict[int, List[Tuple[int, str]]]]:
+    """
+    Kahn 拓扑排序，返回 (拓扑序, 前置表, 后续表)
+
+    两端不都在 task_ids 内的边、自依赖被忽略；存在循环时抛出 DependencyCycleError。
+    """
+    preds: Dict[int, List[Tuple[int, str]]] = {task_id: [] for task_id in task_ids}
+    succs: Dict[int, List[Tuple[int, str]]] = {task_id: [] for task_id in preds}
+    indegree = dict.fromkeys(preds, 0)
+    for pred, succ, kind in edges:
+        if pred in preds and succ in preds and pred != succ:
+            succs[pred].append((succ, kind))
+            preds[succ].append((pred, kind))
+            indegree[succ] += 1
+
+    order = [task_id for task_id, degree in indegree.items() if degree == 0]
+    for task_id in order:  # order 边遍历边追加，即 BFS 队列
+        for succ, _ in succs[task_id]:
+            indegree[succ] -= 1
+            if indegree[succ] == 0:
+                order.append(succ)
+
+    if len(order) < len(preds):
+        raise DependencyCycleError(_find_cycle(indegree, preds))
+    return order, preds, succs
+
+
+def _find_cycle(indegree: Dict[int, int], preds: Dict[int, List[Tuple[int, str]]]) -> List[int]:
+    """Kahn 排序剩下的任务都有同样剩下的前置任务，沿前置任务回溯必然回到走过的任务"""
+    task_id = next(task_id for task_id, degree in indegree.items() if degree > 0)
+    path: List[int] = []
+    seen: Dict[int, int] = {}
+    while task_id not in seen:
+        seen[task_id] = len(path)
+        path.append(task_id)
+        task_id = next(pred for pred, _ in preds[task_id] if indegree[pred] > 0)
+    cycle = path[seen[task_id]:]
+    cycle.reverse()
+    return cycle
+
+
+def critical_path(
+    tasks: Dict[int, Tuple[int, int]],
+    edges: Iterable[Edge]
+) -> Tuple[List[int], Dict[int, Tuple[int, int, int, int]]]:
+    """
+    关键路径计算
+
+    tasks 为 任务 id -> (最早可开工偏移天数, 工期天数)，偏移以项目基准日为 0；
+    返回 (拓扑序, 任务 id -> (ES, EF, LS, LF))，EF / LF 为完工次日的偏移。
+    依赖类型约束（d 为后续任务工期）：
+    FS: ES ≥ 前置 EF；SS: ES ≥ 前置 ES；FF: ES ≥ 前置 EF - d；SF: ES ≥ 前置 ES - d
+    """
+    order, preds, succs = topological_order(tasks, edges)
+
+    early: Dict[int, Tuple[int, int]] = {}
+    for task_id in order:
+        es, duration = tasks[task_id]
+        for pred, kind in preds[task_id]:
+            pred_es, pred_ef = early[pred]
+            if kind == START_TO_START:
+                bound = pred_es
+            elif kind == FINISH_TO_FINISH:
+                bound = pred_ef - duration
+            elif kind == START_TO_FINISH:
+                bound = pred_es - duration
+            else:
+                bound = pred_ef
+            if bound > es:
+                es = bound
+        early[task_id] = (es, es + duration)
+
+    finish = max((ef for _, ef in early.values()), default=0)
+    result: Dict[int, Tuple[int, int, int, int]] = {}
+    for task_id in reversed(order):
+        duration = tasks[task_id][1]
+        lf = finish
+        for succ, kind in succs[task_id]:
+            _, _, succ_ls, succ_lf = result[succ]
+            if kind == START_TO_START:
+                bound = succ_ls + duration
+            elif kind == FINISH_TO_FINISH:
+                bound = succ_lf
+            elif kind == START_TO_FINISH:
+                bound = succ_lf + duration
+            else:
+                bound = succ_ls
+            if bound < lf:
+                lf = bound
+        result[task_id] = (*early[task_id], lf - duration, lf)
+    return order, result
+
+
+def task_duration(plan_start: Optional[date], plan_end: Optional[date], duration_days: Optional[int]) -> int:
+    """任务工期（天）：优先 duration_days，其次计划起止日期（含首尾），都没有按 1 天"""
+    if duration_days is not None:
+        return max(duration_days, 0)
+    if plan_start and plan_end:
+        return max((plan_end - plan_start).days + 1, 0)
+    return 1
+
+
+def forecast_window(
+    task: Any,
+    bounds: Iterable[Tuple[str, date, date]],
+    today: Optional[date] = None
+) -> Tuple[Optional[date], Optional[date]]:
+    """
+    任务的预计 (开始, 完成) 日期（含首尾）
+
+    已开工 / 已完工的以实际日期为准；未开工的取计划开工与各前置约束中最晚者，
+    bounds 为前置任务的 (依赖类型, 预计开始, 预计完成)，约束与 critical_path 一致：
+    FF 与前置任务同日完工，SF 在前置任务开工前一天完工。
+    已开工未完工的任务按未完成进度折算剩余工期，预计完成不早于 today + 剩余工期。
+    """
+    duration = task_duration(task.plan_start, task.plan_end, task.duration_days)
+    span = timedelta(days=max(duration - 1, 0))
+
+    start = task.actual_start
+    if start is None:
+        start = task.plan_start
+        for kind, pred_start, pred_end in bounds:
+            if kind == START_TO_START:
+                bound = pred_start
+            elif kind == FINISH_TO_FINISH:
+                bound = pred_end and pred_end + timedelta(days=1 - duration)
+            elif kind == START_TO_FINISH:
+                bound = pred_start and pred_start - timedelta(days=duration)
+            else:
+                bound = pred_end and pred_end + timedelta(days=1)
+            if bound and (start is None or bound > start):
+                start = bound
+
+    if task.actual_end:
+        return start or task.actual_end, task.actual_end
+    if start is None:
+        return None, task.plan_end
+    end = start + span
+    if task.actual_start:
+        remaining = -(-duration * (100 - min(task.progress_percent or 0, 100)) // 100)
+        if remaining:
+            end = max(end, (today or date.today()) + timedelta(days=remaining - 1))
+    return start, end
+
+
+class ScheduleService:
+    """项目进度计划"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def load_edges(self, project_id: int) -> List[Edge]:
+        """项目内的依赖边（两端都属于该项目）"""
+        result = await self.db.execute(
+            select(TaskDependency.depends_on_task_id, TaskDependency.task_id, TaskDependency.dependency_type)
+            .join(Task, Task.id == TaskDependency.task_id)
+            .where(Task.project_id == project_id)
+        )
+        return [(pred, succ, kind or FINISH_TO_START) for pred, succ, kind in result.all()]
+
+    async def check_dependencies(self, task_id: int, project_id: int, edges: Sequence[Edge]):
+        """以 edges 替换 task_id 的前置依赖后检查是否成环，成环时抛出 DependencyCycleError"""
+        result = await self.db.execute(select(Task.id).where(Task.project_id == project_id))
+        current = [edge for edge in await self.load_edges(project_id) if edge[1] != task_id]
+        topological_order(result.scalars().all(), current + list(edges))
+
+    async def propagate(self, task_id: int) -> List[Dict[str, Any]]:
+        """
+        任务日期 / 进度变化后，增量推算该任务及其下游任务的预计日期与预计延期天数
+
+        递归 CTE 一次取回下游子图，按拓扑序只重算前置任务预计日期有变化的任务；
+        有变化的任务以一条 executemany UPDATE 写回，由未延期变为延期的任务通知负责人。
+        调用方需先 flush 本任务的修改，并负责提交事务。返回有变化的任务。
+        """
+        return await self.propagate_many([task_id])
+
+    async def propagate_many(self, task_ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """多个任务同时变化（批量更新）时合并为一次下游推算，语义同 propagate"""
+        sources = set(task_ids)
+        if not sources:
+            return []
+        downstream = (
+            select(TaskDependency.task_id)
+            .where(TaskDependency.depends_on_task_id.in_(sources))
+            .cte("downstream", recursive=True)
+        )
+        downstream = downstream.union(
+            select(TaskDependency.task_id)
+            .join(downstream, TaskDependency.depends_on_task_id == downstream.c.task_id)
+        )
+        # 子图内任务的全部前置依赖（前置任务可能在子图外）
+        result = await self.db.execute(
+            select(TaskDependency.depends_on_task_id, TaskDependency.task_id, TaskDependency.dependency_type)
+            .where(TaskDependency.task_id.in_(select(downstream.c.task_id)))
+        )
+        edges = [(pred, succ, kind or FINISH_TO_START) for pred, succ, kind in result.all()]
+        nodes = sources | {succ for _, succ, _ in edges}
+
+        result = await self.db.execute(
+            select(
+                Task.id, Task.project_id, Task.name, Task.manager_id,
+                Task.plan_start, Task.plan_end, Task.duration_days, Task.actual_start, Task.actual_end,
+                Task.progress_percent, Task.forecast_start, Task.forecast_end, Task.forecast_delay_days
+            )
+            .where(Task.id.in_(nodes | {pred for pred, _, _ in edges}))
+        )
+        rows = {row.id: row for row in result.all()}
+        sources &= rows.keys()
+        if not sources:
+            return []
+
+        try:
+            order, _, succs = topological_order(nodes, edges)
+        except DependencyCycleError as e:
+            logger.warning("任务 %s 下游%s，跳过进度推算", sorted(sources), e)
+            return []
+        preds: Dict[int, List[Tuple[int, str]]] = {}
+        for pred, succ, kind in edges:
+            preds.setdefault(succ, []).append((pred, kind))
+
+        # 任务 id -> (预计开始, 预计完成)；子图外的前置任务取已保存的预计值
+        window = {
+            row.id: (row.forecast_start or row.actual_start or row.plan_start,
+                     row.forecast_end or row.actual_end or row.plan_end)
+            for row in rows.values()
+        }
+        dirty = set(sources)
+        changes = []
+        for node in order:
+            if node not in dirty:
+                continue
+            row = rows[node]
+            start, end = forecast_window(row, (
+                (kind, *window[pred]) for pred, kind in preds.get(node, ()) if pred in window
+            ))
+            delay = max((end - row.plan_end).days, 0) if end and row.plan_end else 0
+            # 起点任务自身的计划可能已被修改，下游总是重算
+            if node in sources or (start, end) != window[node]:
+                dirty.update(succ for succ, _ in succs[node])
+            window[node] = (start, end)
+            if (start, end, delay) != (row.forecast_start, row.forecast_end, row.forecast_delay_days or 0):
+                changes.append({
+                    "task_id": node,
+                    "forecast_start": start,
+                    "forecast_end": end,
+                    "forecast_delay_days": delay,
+                    "newly_delayed": delay > 0 and not row.forecast_delay_days
+                })
+
+        if not changes:
+            return []
+
+        table = Task.__table__
+        await self.db.execute(
+            update(table)
+            .where(table.c.id == bindparam("task_id"))
+            .values(
+                forecast_start=bindparam("forecast_start"),
+                forecast_end=bindparam("forecast_end"),
+                forecast_delay_days=bindparam("forecast_delay_days")
+            ),
+            [{key: change[key] for key in ("task_id", "forecast_start", "forecast_end", "forecast_delay_days")}
+             for change in changes]
+        )
+        add_session_tags(
+            self.db,
+            *{f"project:{rows[source].project_id}" for source in sources},
+            *(f"task:{change['task_id']}" for change in changes)
+        )
+
+        notifications = NotificationService(self.db)
+        for change in changes:
+            row = rows[change["task_id"]]
+            if change["newly_delayed"] and row.manager_id:
+                await notifications.notify_task_delayed(
+                    row.manager_id, row.name, change["forecast_delay_days"], row.id, commit=False
+                )
+        return changes
+
+    async def compute(self, project_id: int) -> Optional[Dict[str, Any]]:
+        """计算项目关键路径进度计划；项目不存在返回 None，依赖成环抛出 DependencyCycleError"""
+        result = await self.db.execute(select(Project.start_date).where(Project.id == project_id))
+        project = result.one_or_none()
+        if project is None:
+            return None
+
+        result = await self.db.execute(
+            select(Task.id, Task.task_no, Task.name, Task.plan_start, Task.plan_end, Task.duration_days)
+            .where(Task.project_id == project_id)
+        )
+        rows = result.all()
+        edges = await self.load_edges(project_id)
+
+        # 基准日：项目开工日与最早计划开工日中较早者，偏移不会为负
+        starts = [row.plan_start for row in rows if row.plan_start]
+        base = min([project.start_date, *starts] if project.start_date else starts, default=None) or date.today()
+
+        tasks = {
+            row.id: (
+                (row.plan_start - base).days if row.plan_start else 0,
+                task_duration(row.plan_start, row.plan_end, row.duration_days)
+            )
+            for row in rows
+        }
+        order, schedule = critical_path(tasks, edges)
+
+        def day(offset: int) -> date:
+            return base + timedelta(days=offset)
+
+        items = []
+        critical = []
+        for row in rows:
+            es, ef, ls, lf = schedule[row.id]
+            total_float = ls - es
+            if total_float == 0:
+                critical.append(row.id)
+            items.append({
+                "task_id": row.id,
+                "task_no": row.task_no,
+                "name": row.name,
+                "duration": ef - es,
+                "early_start": day(es),
+                "early_finish": day(max(ef - 1, es)),
+                "late_start": day(ls),
+                "late_finish": day(max(lf - 1, ls)),
+                "total_float": total_float,
+                "critical": total_float == 0
+            })
+
+        position = {task_id: index for index, task_id in enumerate(order)}
+        finish = max((ef for _, ef, _, _ in schedule.values()), default=0)
+        return {
+            "project_id": project_id,
+            "start_date": base,
+            "finish_date": day(max(finish - 1, 0)),
+            "duration": finish,
+            "critical_path": sorted(critical, key=position.__getitem__),
+            "tasks": items
+        }
+
+    async def gantt(
+        self,
+        project_id: int,
+        start: Optional[date] = None,
+        end: Optional[date] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        甘特图数据（列式数组），项目不存在返回 None
+
+        只取计划工期与 [start, end] 有交集的任务（按 idx_tasks_dates 过滤），
+        日期以相对基准日的天数表示，基准日与关键路径计算一致，不随时间窗变化；
+        关键路径标记取自缓存的进度计划，依赖成环时全部为 False。
+        """
+        result = await self.db.execute(
+            select(
+                Project.start_date,
+                select(func.min(Task.plan_start)).where(Task.project_id == project_id).scalar_subquery()
+            )
+            .where(Project.id == project_id)
+        )
+        project = result.one_or_none()
+        if project is None:
+            return None
+        base = min(filter(None, project), default=None) or date.today()
+
+        query = (
+            select(
+                Task.id, Task.task_no, Task.name, Task.status, Task.plan_start, Task.plan_end,
+                Task.actual_start, Task.actual_end, Task.progress_percent
+            )
+            .where(Task.project_id == project_id)
+            .order_by(Task.plan_start, Task.id)
+        )
+        if end is not None:
+            query = query.where(Task.plan_start <= end)
+        if start is not None:
+            query = query.where(Task.plan_end >= start)
+        result = await self.db.execute(query)
+        rows = result.all()
+
+        try:
+            schedule = await project_schedule(project_id, self.db)
+            critical = set(schedule["critical_path"]) if schedule else set()
+        except DependencyCycleError:
+            critical = set()
+
+        def offset(value: Optional[date]) -> Optional[int]:
+            return (value - base).days if value else None
+
+        return {
+            "project_id": project_id,
+            "base_date": base,
+            "start": start,
+            "end": end,
+            "ids": [row.id for row in rows],
+            "task_nos": [row.task_no for row in rows],
+            "names": [row.name for row in rows],
+            "status": [row.status for row in rows],
+            "plan_start": [offset(row.plan_start) for row in rows],
+            "plan_end": [offset(row.plan_end) for row in rows],
+            "actual_start": [offset(row.actual_start) for row in rows],
+            "actual_end": [offset(row.actual_end) for row in rows],
+            "progress": [row.progress_percent or 0 for row in rows],
+            "critical": [row.id in critical for row in rows]
+        }
+
+
+@cached(
+    expire=settings.PROJECT_SCHEDULE_TTL,
+    key_prefix="schedule",
+    tags=("project:{project_id}",)
+)
+async def project_schedule(project_id: int, db: AsyncSession) -> Optional[Dict[str, Any]]:
+    """项目进度计划（缓存；项目任务或依赖变化提交后失效）"""
+    return await ScheduleService(db).compute(project_id)
+
+
+@cached(
+    expire=settings.PROJECT_SCHEDULE_TTL,
+    key_prefix="gantt",
+    tags=("project:{project_id}",)
+)
+async def project_gantt(
+    project_id: int,
+    start: Optional[date],
+    end: Optional[date],
+    db: AsyncSession
+) -> Optional[Dict[str, Any]]:
+    """
+    甘特图数据与 ETag（缓存；项目任务或依赖变化提交后失效）
+
+    返回 {"etag": ..., "body": 编码后的 JSON 文本}，条件请求命中时无需查库与编码。
+    """
+    gantt = await ScheduleService(db).gantt(project_id, start, end)
+    if gantt is None:
+        return None
+    body = codec.JSON.dumps(gantt)
+    return {
+        "etag": f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+        "body": body.decode()
+    }
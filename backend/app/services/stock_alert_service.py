@@ -0,0 +1,121 @@
+"""
+库存预警服务
+库存变动后只评估受影响的物料：库存跨越最低库存 / 安全库存时才写入预警并通知，
+生效中的预警保存在 stock_alerts（每物料一条），预警列表由缓存提供
+"""
+
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import Material, MaterialStock, StockAlert, User
+from app.services.notification_service import NotificationService
+from app.utils.cache import add_session_tags
+from app.utils.query import upsert
+
+# 预警级别，严重程度递增
+ALERT_LEVELS = ("warning", "critical")
+
+
+def alert_level(
+    quantity: Decimal,
+    min_stock: Optional[Decimal],
+    safety_stock: Optional[Decimal]
+) -> Optional[str]:
+    """库存所处的预警级别：低于最低库存为 critical，低于安全库存为 warning，否则为 None"""
+    if min_stock and quantity < min_stock:
+        return "critical"
+    if safety_stock and quantity < safety_stock:
+        return "warning"
+    return None
+
+
+class StockAlertService:
+    """
+    库存预警服务
+
+    以 stock_alerts 中的当前级别为基准比较新级别：级别不变不写库、不通知，
+    同一物料的预警不会重复产生；新增或升级时批量插入通知，恢复后删除预警。
+    出入库调用时 material_stock 行锁已由本事务持有，同一物料的评估按事务串行。
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def evaluate(
+        self,
+        material_ids: Optional[Iterable[int]] = None,
+        notify: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        重新评估物料的预警状态，返回新产生或升级的预警
+
+        material_ids 为 None 时评估全部物料（对账后重建预警用）。
+        调用方负责提交事务。
+        """
+        query = (
+            select(
+                Material.id, Material.name, Material.min_stock, Material.safety_stock,
+                func.coalesce(MaterialStock.quantity, 0), StockAlert.level
+            )
+            .outerjoin(MaterialStock, MaterialStock.material_id == Material.id)
+            .outerjoin(StockAlert, StockAlert.material_id == Material.id)
+            .order_by(Material.id)
+        )
+        if material_ids is not None:
+            material_ids = sorted(set(material_ids))
+            if not material_ids:
+                return []
+            query = query.where(Material.id.in_(material_ids))
+        result = await self.db.execute(query)
+
+        changed: List[Dict[str, Any]] = []
+        raised: List[Dict[str, Any]] = []
+        resolved: List[int] = []
+        listed = False
+        for material_id, name, min_stock, safety_stock, quantity, active in result.all():
+            level = alert_level(Decimal(quantity), min_stock, safety_stock)
+            # 预警中的物料库存有变动，列表中的当前库存需要刷新
+            listed = listed or bool(level or active)
+            if level == active:
+                continue
+            if level is None:
+                resolved.append(material_id)
+                continue
+            changed.append({"material_id": material_id, "level": level})
+            if active is None or ALERT_LEVELS.index(level) > ALERT_LEVELS.index(active):
+                raised.append({
+                    "material_id": material_id,
+                    "material_name": name,
+                    "level": level,
+                    "current_stock": quantity,
+                    "min_stock": min_stock,
+                    "safety_stock": safety_stock
+                })
+
+        if resolved:
+            await self.db.execute(delete(StockAlert).where(StockAlert.material_id.in_(resolved)))
+        if changed:
+            stmt = upsert(self.db, StockAlert).values(changed)
+            await self.db.execute(stmt.on_conflict_do_update(
+                index_elements=[StockAlert.material_id],
+                set_={"level": stmt.excluded.level, "updated_at": func.now()}
+            ))
+        if listed:
+            add_session_tags(self.db, "stock_alerts")
+        if raised and notify:
+            await self._notify(raised)
+        return raised
+
+    async def _notify(self, alerts: List[Dict[str, Any]]):
+        """向预警接收角色批量发送通知（一条多行 INSERT）"""
+        result = await self.db.execute(
+            select(User.id).where(User.role.in_(settings.INVENTORY_ALERT_ROLES), User.is_active == True)
+        )
+        user_ids = result.scalars().all()
+        if not user_ids:
+            return
+
+        await NotificationService(self.db).notify_inventory_alerts(alerts, user_ids)
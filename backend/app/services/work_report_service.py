@@ -0,0 +1,154 @@
+"""
+报工服务
+报工只追加写入 work_reports 流水，任务实际工时以原子 UPDATE 累加，
+并发报工与离线终端批量同步都不会丢失工时
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import bindparam, case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Task, WorkReport
+from app.services.schedule_service import ScheduleService
+from app.utils.cache import add_session_tags
+from app.utils.query import upsert
+
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+NOT_FOUND = "not_found"
+
+
+def _utc_naive(value: Optional[datetime]) -> datetime:
+    """终端上报时间统一为 UTC（无时区），未上报时取当前时间"""
+    if value is None:
+        return datetime.utcnow()
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class WorkReportService:
+    """
+    报工服务
+
+    一批报工：一条多行 INSERT 写入流水（client_id 重复的行由 ON CONFLICT 跳过），
+    按任务汇总后以一条 executemany UPDATE 累加工时，按任务 id 顺序加行锁，
+    同一任务的并发报工在数据库内串行累加。进度取已报最大值，不因迟到的离线报工回退。
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def record(self, reports: List[Dict[str, Any]], user_id: Optional[int]) -> List[str]:
+        """
+        记录报工，按输入顺序返回每条的结果：accepted / duplicate / not_found
+
+        reports 每项含 task_id、work_hours、progress_percent，可选 remark、photo_urls、
+        client_id、reported_at。调用方负责提交事务。
+        """
+        result = await self.db.execute(
+            select(Task.id, Task.project_id, Task.progress_percent, Task.actual_start, Task.actual_end)
+            .where(Task.id.in_({report["task_id"] for report in reports}))
+        )
+        tasks = {row.id: row for row in result.all()}
+
+        statuses: List[str] = []
+        rows: List[Dict[str, Any]] = []
+        positions: List[int] = []
+        seen = set()
+        for report in reports:
+            client_id = report.get("client_id")
+            if report["task_id"] not in tasks:
+                statuses.append(NOT_FOUND)
+                continue
+            if client_id is not None and client_id in seen:
+                statuses.append(DUPLICATE)
+                continue
+            seen.add(client_id)
+            positions.append(len(statuses))
+            statuses.append(ACCEPTED)
+            rows.append({
+                "task_id": report["task_id"],
+                "user_id": user_id,
+                "work_hours": report["work_hours"],
+                "progress_percent": report["progress_percent"],
+                "remark": report.get("remark"),
+                "photo_urls": report.get("photo_urls") or None,
+                "client_id": client_id,
+                "reported_at": _utc_naive(report.get("reported_at"))
+            })
+        if not rows:
+            return statuses
+
+        stmt = upsert(self.db, WorkReport).values(rows)
+        result = await self.db.execute(
+            stmt.on_conflict_do_nothing(index_elements=[WorkReport.client_id])
+            .returning(WorkReport.client_id)
+        )
+        inserted = set(result.scalars().all())
+        # 已同步过的 client_id 不再累加
+        duplicates = {row["client_id"] for row in rows if row["client_id"] is not None} - inserted
+        if duplicates:
+            for position, row in zip(positions, rows):
+                if row["client_id"] in duplicates:
+                    statuses[position] = DUPLICATE
+            rows = [row for row in rows if row["client_id"] not in duplicates]
+
+        totals: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            total = totals.setdefault(row["task_id"], {
+                "task_id": row["task_id"], "hours": 0, "progress": 0, "start_date": None, "end_date": None
+            })
+            day = row["reported_at"].date()
+            total["hours"] += row["work_hours"]
+            total["progress"] = max(total["progress"], row["progress_percent"])
+            if row["progress_percent"] > 0:
+                total["start_date"] = min(filter(None, (total["start_date"], day)))
+            if row["progress_percent"] == 100:
+                total["end_date"] = min(filter(None, (total["end_date"], day)))
+        if not totals:
+            return statuses
+
+        await self._apply(sorted(totals.values(), key=lambda total: total["task_id"]))
+
+        # 进度推进（含首次开工 / 完工）的任务沿依赖推算下游预计日期
+        scheduled = [
+            task_id for task_id, total in totals.items()
+            if total["progress"] > (tasks[task_id].progress_percent or 0)
+            or (total["start_date"] and tasks[task_id].actual_start is None)
+            or (total["end_date"] and tasks[task_id].actual_end is None)
+        ]
+        if scheduled:
+            await ScheduleService(self.db).propagate_many(scheduled)
+
+        add_session_tags(
+            self.db,
+            *{f"project:{tasks[task_id].project_id}" for task_id in totals},
+            *(f"task:{task_id}" for task_id in totals)
+        )
+        return statuses
+
+    async def _apply(self, totals: List[Dict[str, Any]]):
+        """按任务原子累加工时并推进进度、状态与实际开工 / 完工日期（executemany）"""
+        table = Task.__table__
+        progress = case(
+            (func.coalesce(table.c.progress_percent, 0) < bindparam("progress"), bindparam("progress")),
+            else_=func.coalesce(table.c.progress_percent, 0)
+        )
+        await self.db.execute(
+            update(table)
+            .where(table.c.id == bindparam("task_id"))
+            .values(
+                actual_work_hours=func.coalesce(table.c.actual_work_hours, 0) + bindparam("hours"),
+                progress_percent=progress,
+                status=case(
+                    (progress >= 100, "completed"),
+                    (progress > 0, "in_progress"),
+                    else_=table.c.status
+                ),
+                actual_start=func.coalesce(table.c.actual_start, bindparam("start_date")),
+                actual_end=func.coalesce(table.c.actual_end, bindparam("end_date"))
+            ),
+            totals
+        )
@@ -1,106 +1,533 @@
 """
 缓存工具
-Redis 缓存封装
+两级缓存封装：进程内 LRU + Redis
 """
 
 import json
-import pickle
-from typing import Any, Optional, Union
+import math
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import inspect
+import logging
+import functools
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, NamedTuple, Optional, Sequence, Set, Tuple, Union
 from datetime import timedelta
 import redis.asyncio as redis
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+from starlette.background import BackgroundTasks
+from starlette.requests import Request
+from starlette.responses import Response
 
 from app.config import settings
+from app.utils import codec
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCache:
+    """进程内 LRU 缓存（一级缓存），按条目数限制内存并带过期时间，支持按标签剔除"""
+    
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._key_tags: Dict[str, Tuple[str, ...]] = {}
+        # 每次按标签剔除 / 清空时递增，回写前比较以丢弃期间可能已失效的结果
+        self.generation = 0
+    
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            return None
+        
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        if ttl <= 0:
+            self.delete(key)
+            return
+        
+        self._untag(key)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        if tags:
+            self._key_tags[key] = tuple(tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+        while len(self._data) > self.max_entries:
+            evicted, _ = self._data.popitem(last=False)
+            self._untag(evicted)
+    
+    def delete(self, key: str):
+        self._data.pop(key, None)
+        self._untag(key)
+    
+    def invalidate_tags(self, tags: Iterable[str]):
+        """剔除带有任一标签的条目"""
+        self.generation += 1
+        for tag in tags:
+            for key in self._tags.pop(tag, ()):
+                self.delete(key)
+    
+    def _untag(self, key: str):
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+    
+    def clear(self):
+        self.generation += 1
+        self._data.clear()
+        self._tags.clear()
+        self._key_tags.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TagSnapshot(NamedTuple):
+    """读取数据前的标签代数：本进程 L1 代数与 Redis 中各标签代数（Redis 不可用时为 None）"""
+    local: int
+    remote: Optional[Dict[str, int]]
 
 
 class Cache:
-    """Redis 缓存封装"""
+    """
+    两级缓存：进程内 LRU（L1）+ Redis（L2）
+    
+    - 读取先查 L1，未命中再查 Redis 并回填 L1
+    - 写入 / 删除通过 Redis pub/sub 广播，其他 worker 同步剔除 L1
+    - Redis 不可用时退化为仅 L1，并在 CACHE_REDIS_RETRY 秒后重试
+    - Redis 中的值按 key 命名空间（第一个 ":" 之前的部分）选择编码，默认 JSON
+    - 写入时可附带标签（如 project:1、inventory），按标签批量失效；
+      ORM 提交后自动失效所修改实体的标签，见 entity_tags
+    - 旁路回写（先查库再写缓存）可带上查库前的 tag_snapshot，期间标签被失效过则不写，
+      避免旧值覆盖刚发生的失效
+    
+    L1 中保存的是反序列化后的对象，调用方不应修改返回值。
+    """
+    
+    INVALIDATION_CHANNEL = "cache:invalidate"
+    
+    # 标签代数 key 的存活时间（秒），须远长于任何一次旁路回写的查库耗时
+    TAG_GENERATION_TTL = 86400
+    
+    # 命名空间 -> 编码；orjson 编解码最快，msgpack 体积约小 15%，用于常驻 Redis 的大列表
+    CODECS: Dict[str, codec.Codec] = {
+        "inventory": codec.MSGPACK,
+    }
     
     def __init__(self):
         self._redis: Optional[redis.Redis] = None
+        self._local = LocalCache(settings.CACHE_L1_MAX_ENTRIES)
+        self._local_ttl = settings.CACHE_L1_TTL
+        self._retry_at = 0.0
+        self._listener: Optional[asyncio.Task] = None
+        self._instance_id = uuid.uuid4().hex
     
     async def connect(self):
-        """连接 Redis"""
+        """连接 Redis 并订阅失效通知"""
         if not self._redis:
+            # 值为二进制编码，不做响应解码；Redis 无响应时按超时失败，不阻塞请求
             self._redis = await redis.from_url(
                 settings.REDIS_URL,
-                encoding="utf-8",
-                decode_responses=True
+                socket_connect_timeout=settings.CACHE_REDIS_CONNECT_TIMEOUT,
+                socket_timeout=settings.CACHE_REDIS_TIMEOUT
             )
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
     
     async def disconnect(self):
         """断开连接"""
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
         if self._redis:
             await self._redis.close()
             self._redis = None
     
+    async def _client(self) -> Optional[redis.Redis]:
+        """获取 Redis 客户端；处于故障退避期时返回 None"""
+        if time.monotonic() < self._retry_at:
+            return None
+        if not self._redis or self._listener is None or self._listener.done():
+            await self.connect()
+        return self._redis
+    
+    def _mark_down(self, error: Exception):
+        """Redis 故障：进入退避期，期间仅使用 L1"""
+        if time.monotonic() >= self._retry_at:
+            logger.warning("Redis 不可用，%s 秒内仅使用本地缓存: %s", settings.CACHE_REDIS_RETRY, error)
+        self._retry_at = time.monotonic() + settings.CACHE_REDIS_RETRY
+        # 故障期间可能错过其他 worker 的失效通知
+        self._local.clear()
+    
+    async def _listen(self):
+        """订阅失效通知，剔除其他 worker 已修改的 L1 条目"""
+        pubsub = self._redis.pubsub()
+        try:
+            await pubsub.subscribe(self.INVALIDATION_CHANNEL)
+            # 订阅建立前的通知可能已丢失
+            self._local.clear()
+            while True:
+                # 阻塞读取会受 socket_timeout 限制，空闲时按超时返回 None 后继续等待
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None or message["type"] != "message":
+                    continue
+                payload = json.loads(message["data"])
+                if payload.get("origin") == self._instance_id:
+                    continue
+                for key in payload.get("keys", []):
+                    self._local.delete(key)
+                self._local.invalidate_tags(payload.get("tags", []))
+        except asyncio.CancelledError:
+            raise
+        except (RedisError, OSError) as e:
+            self._mark_down(e)
+        finally:
+            try:
+                await pubsub.close()
+            except (RedisError, OSError):
+                pass
+    
+    async def _publish_invalidation(self, client: redis.Redis, *keys: str):
+        await client.publish(self.INVALIDATION_CHANNEL, self._invalidation_message(*keys))
+    
+    def _invalidation_message(self, *keys: str) -> str:
+        return json.dumps({"origin": self._instance_id, "keys": list(keys)})
+    
+    @staticmethod
+    def tag_key(tag: str) -> str:
+        """标签在 Redis 中对应的集合，成员为带该标签的缓存 key"""
+        return f"tag:{tag}"
+    
+    @staticmethod
+    def tag_generation_key(tag: str) -> str:
+        """标签代数计数器，invalidate_tags 时递增"""
+        return f"tag-gen:{tag}"
+    
+    @classmethod
+    def register_codec(cls, namespace: str, value_codec: codec.Codec):
+        """为 key 命名空间指定编码"""
+        cls.CODECS[namespace] = value_codec
+    
+    def _encode(self, key: str, value: Any) -> bytes:
+        namespace = key.split(":", 1)[0]
+        return codec.encode(value, self.CODECS.get(namespace, codec.JSON))
+    
+    @staticmethod
+    def _decode(value: bytes) -> Any:
+        return codec.decode(value)
+    
     async def get(self, key: str) -> Optional[Any]:
         """获取缓存"""
-        if not self._redis:
-            await self.connect()
+        value = self._local.get(key)
+        if value is not None:
+            return value
         
-        value = await self._redis.get(key)
+        client = await self._client()
+        if client is None:
+            return None
+        
+        try:
+            value = await client.get(key)
+        except (RedisError, OSError) as e:
+            self._mark_down(e)
+            return None
         if value is None:
             return None
         
+        value = self._decode(value)
+        self._local.set(key, value, self._local_ttl)
+        return value
+    
+    def _local_ttl_for(self, expire: Optional[int]) -> float:
+        return self._local_ttl if expire is None else min(expire, self._local_ttl)
+    
+    def pipeline(self) -> "CachePipeline":
+        """
+        批量写入：上下文内排队的 set / delete 在退出时通过一个 Redis 管道提交
+        
+        用法:
+            async with cache.pipeline() as pipe:
+                pipe.set(key, value, expire=60, tags=("material:1",))
+                pipe.delete(other_key)
+        """
+        return CachePipeline(self)
+    
+    async def tag_snapshot(self, *tags: str) -> TagSnapshot:
+        """
+        标签快照：在读取数据库之前获取，回写时传给 pipe.set(..., snapshot=)
+        
+        Redis 中的代数由写入脚本原子比较，快照之后其他 worker 的失效也能识别。
+        """
+        local = self._local.generation
+        client = await self._client()
+        if client is None:
+            return TagSnapshot(local, None)
+        
         try:
-            return pickle.loads(value.encode())
-        except:
-            return value
+            values = await client.mget([self.tag_generation_key(tag) for tag in tags]) if tags else []
+        except (RedisError, OSError) as e:
+            self._mark_down(e)
+            return TagSnapshot(local, None)
+        return TagSnapshot(local, {tag: int(value or 0) for tag, value in zip(tags, values)})
+    
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """批量获取缓存（L1 未命中的 key 用一次 MGET），只返回命中的 key"""
+        found: Dict[str, Any] = {}
+        missing = []
+        for key in keys:
+            value = self._local.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+        if not missing:
+            return found
+        
+        client = await self._client()
+        if client is None:
+            return found
+        
+        try:
+            values = await client.mget(missing)
+        except (RedisError, OSError) as e:
+            self._mark_down(e)
+            return found
+        
+        for key, value in zip(missing, values):
+            if value is None:
+                continue
+            value = self._decode(value)
+            self._local.set(key, value, self._local_ttl)
+            found[key] = value
+        return found
     
     async def set(
         self,
         key: str,
         value: Any,
-        expire: Union[int, timedelta] = None
+        expire: Union[int, timedelta] = None,
+        tags: Iterable[str] = ()
     ):
-        """设置缓存"""
-        if not self._redis:
-            await self.connect()
+        """
+        设置缓存
         
-        if isinstance(value, (dict, list)):
-            value = json.dumps(value)
-        elif not isinstance(value, (str, bytes)):
-            value = pickle.dumps(value)
+        Args:
+            tags: 缓存标签，invalidate_tags 时一并删除
+        """
+        async with self.pipeline() as pipe:
+            pipe.set(key, value, expire, tags)
+    
+    async def set_many(
+        self,
+        mapping: Dict[str, Any],
+        expire: Union[int, timedelta] = None,
+        tags: Iterable[str] = ()
+    ):
+        """批量设置缓存（一次管道往返）"""
+        async with self.pipeline() as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, expire, tags)
+    
+    async def delete_many(self, *keys: str):
+        """批量删除缓存（一次管道往返）"""
+        async with self.pipeline() as pipe:
+            for key in keys:
+                pipe.delete(key)
+    
+    async def invalidate_tags(self, *tags: str):
+        """
+        删除带有任一标签的缓存，并通知其他 worker
         
-        if isinstance(expire, timedelta):
-            expire = int(expire.total_seconds())
+        删除、标签代数递增与广播在同一个 Lua 脚本中完成（一次往返）；广播中带上被删除的 key，
+        从 Redis 回填到 L1 的条目没有标签信息，需按 key 剔除。
+        """
+        if not tags:
+            return
+        self._local.invalidate_tags(tags)
+        
+        client = await self._client()
+        if client is None:
+            return
         
-        await self._redis.set(key, value, ex=expire)
+        try:
+            deleted = await client.eval(
+                self._INVALIDATE_TAGS_SCRIPT,
+                2 * len(tags),
+                *[self.tag_key(tag) for tag in tags],
+                *[self.tag_generation_key(tag) for tag in tags],
+                self.INVALIDATION_CHANNEL,
+                self._instance_id,
+                self.TAG_GENERATION_TTL,
+                *tags
+            )
+        except (RedisError, OSError) as e:
+            self._mark_down(e)
+            return
+        for key in deleted:
+            self._local.delete(key.decode())
     
     async def delete(self, key: str):
         """删除缓存"""
-        if not self._redis:
-            await self.connect()
-        
-        await self._redis.delete(key)
+        async with self.pipeline() as pipe:
+            pipe.delete(key)
     
     async def exists(self, key: str) -> bool:
         """检查 key 是否存在"""
-        if not self._redis:
-            await self.connect()
+        if self._local.get(key) is not None:
+            return True
         
-        return await self._redis.exists(key) > 0
+        client = await self._client()
+        if client is None:
+            return False
+        
+        try:
+            return await client.exists(key) > 0
+        except (RedisError, OSError) as e:
+            self._mark_down(e)
+            return False
     
     async def expire(self, key: str, seconds: int):
         """设置过期时间"""
-        if not self._redis:
-            await self.connect()
+        value = self._local.get(key)
+        if value is not None:
+            self._local.set(key, value, min(seconds, self._local_ttl))
+        
+        client = await self._client()
+        if client is None:
+            return
+        
+        try:
+            await client.expire(key, seconds)
+        except (RedisError, OSError) as e:
+            self._mark_down(e)
+    
+    async def _incr_by(self, key: str, amount: int) -> int:
+        client = await self._client()
+        if client is not None:
+            try:
+                value = await client.incrby(key, amount)
+                self._local.delete(key)
+                await self._publish_invalidation(client, key)
+                return value
+            except (RedisError, OSError) as e:
+                self._mark_down(e)
         
-        await self._redis.expire(key, seconds)
+        # 仅 L1 模式：进程内计数
+        value = int(self._local.get(key) or 0) + amount
+        self._local.set(key, value, self._local_ttl)
+        return value
     
     async def incr(self, key: str) -> int:
         """自增"""
-        if not self._redis:
-            await self.connect()
-        
-        return await self._redis.incr(key)
+        return await self._incr_by(key, 1)
     
     async def decr(self, key: str) -> int:
         """自减"""
-        if not self._redis:
-            await self.connect()
+        return await self._incr_by(key, -1)
+    
+    async def acquire_lock(self, name: str, timeout: float) -> Optional[str]:
+        """
+        获取跨 worker 互斥锁（SET NX PX），成功返回令牌，失败返回 None
+        
+        仅 L1 模式下无法跨进程互斥，直接视为获取成功。
+        """
+        token = uuid.uuid4().hex
+        client = await self._client()
+        if client is None:
+            return token
         
-        return await self._redis.decr(key)
+        try:
+            acquired = await client.set(f"lock:{name}", token, nx=True, px=int(timeout * 1000))
+        except (RedisError, OSError) as e:
+            self._mark_down(e)
+            return token
+        return token if acquired else None
+    
+    async def release_lock(self, name: str, token: str):
+        """释放互斥锁（仅当锁仍属于该令牌时删除）"""
+        client = await self._client()
+        if client is None:
+            return
+        
+        try:
+            await client.eval(self._RELEASE_LOCK_SCRIPT, 1, f"lock:{name}", token)
+        except (RedisError, OSError) as e:
+            self._mark_down(e)
+    
+    _RELEASE_LOCK_SCRIPT = """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("del", KEYS[1])
+    end
+    return 0
+    """
+    
+    # KEYS: 标签集合..., 标签代数...；ARGV: 频道, 实例 id, 代数存活秒数, 标签...
+    _INVALIDATE_TAGS_SCRIPT = """
+    local deleted = {}
+    local n = #KEYS / 2
+    for i = 1, n do
+        local tag_key = KEYS[i]
+        redis.call("incr", KEYS[n + i])
+        redis.call("expire", KEYS[n + i], ARGV[3])
+        local members = redis.call("smembers", tag_key)
+        for i = 1, #members, 1000 do
+            redis.call("del", unpack(members, i, math.min(i + 999, #members)))
+        end
+        for _, key in ipairs(members) do
+            deleted[#deleted + 1] = key
+        end
+        redis.call("del", tag_key)
+    end
+    local tags = {unpack(ARGV, 4)}
+    redis.call("publish", ARGV[1], cjson.encode({origin = ARGV[2], keys = deleted, tags = tags}))
+    return deleted
+    """
+    
+    # 带快照的写入：各标签代数与快照一致才写入并登记标签
+    # KEYS: 缓存 key, 标签集合..., 标签代数...；ARGV: 值, 过期秒数（0 为不过期）, 快照代数...
+    _GUARDED_SET_SCRIPT = """
+    local n = (#KEYS - 1) / 2
+    for i = 1, n do
+        if tonumber(redis.call("get", KEYS[1 + n + i]) or "0") ~= tonumber(ARGV[2 + i]) then
+            return 0
+        end
+    end
+    local expire = tonumber(ARGV[2])
+    if expire > 0 then
+        redis.call("set", KEYS[1], ARGV[1], "EX", expire)
+    else
+        redis.call("set", KEYS[1], ARGV[1])
+    end
+    for i = 2, n + 1 do
+        redis.call("sadd", KEYS[i], KEYS[1])
+        if expire > 0 then
+            redis.call("expire", KEYS[i], expire, "NX")
+            redis.call("expire", KEYS[i], expire, "GT")
+        else
+            redis.call("persist", KEYS[i])
+        end
+    end
+    return 1
+    """
     
     # 常用缓存 key 生成方法
     @staticmethod
@@ -119,6 +546,10 @@ class Cache:
     def material_key(material_id: int) -> str:
         return f"material:{material_id}"
     
+    @staticmethod
+    def material_stock_key(material_id: int) -> str:
+        return f"material:{material_id}:stock"
+    
     @staticmethod
     def dashboard_stats_key() -> str:
         return "dashboard:stats"
@@ -128,36 +559,402 @@ class Cache:
         return "inventory:alerts"
 
 
+class CachePipeline:
+    """
+    缓存批量写入
+    
+    L1 立即更新；Redis 写入、标签登记与失效广播在退出上下文时合并为一个管道。
+    带 snapshot 的写入在快照之后标签被失效过时跳过（L1 按本进程代数，Redis 按脚本原子比较）。
+    """
+    
+    def __init__(self, owner: Cache):
+        self._cache = owner
+        self._sets: Dict[str, Tuple[Any, Optional[int], Tuple[str, ...], Optional[TagSnapshot]]] = {}
+        self._deletes: Set[str] = set()
+    
+    async def __aenter__(self) -> "CachePipeline":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.execute()
+    
+    def set(
+        self,
+        key: str,
+        value: Any,
+        expire: Union[int, timedelta] = None,
+        tags: Iterable[str] = (),
+        snapshot: Optional[TagSnapshot] = None
+    ):
+        if isinstance(expire, timedelta):
+            expire = int(expire.total_seconds())
+        tags = tuple(tags)
+        
+        if snapshot is None or snapshot.local == self._cache._local.generation:
+            self._cache._local.set(key, value, self._cache._local_ttl_for(expire), tags)
+        self._deletes.discard(key)
+        self._sets[key] = (value, expire, tags, snapshot)
+    
+    def delete(self, key: str):
+        self._cache._local.delete(key)
+        self._sets.pop(key, None)
+        self._deletes.add(key)
+    
+    async def execute(self):
+        """提交排队的写入"""
+        sets, deletes = self._sets, self._deletes
+        self._sets, self._deletes = {}, set()
+        if not sets and not deletes:
+            return
+        
+        owner = self._cache
+        client = await owner._client()
+        if client is None:
+            return
+        
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, (value, expire, tags, snapshot) in sets.items():
+                if snapshot is not None:
+                    # 快照时 Redis 不可用，无法确认期间是否失效，只保留 L1
+                    if snapshot.remote is not None:
+                        pipe.eval(
+                            owner._GUARDED_SET_SCRIPT,
+                            1 + 2 * len(tags),
+                            key,
+                            *[owner.tag_key(tag) for tag in tags],
+                            *[owner.tag_generation_key(tag) for tag in tags],
+                            owner._encode(key, value),
+                            expire or 0,
+                            *[snapshot.remote[tag] for tag in tags]
+                        )
+                    continue
+                pipe.set(key, owner._encode(key, value), ex=expire)
+                for tag in tags:
+                    tag_key = owner.tag_key(tag)
+                    pipe.sadd(tag_key, key)
+                    # 标签集合至少与其中最晚过期的条目一样长
+                    if expire is None:
+                        pipe.persist(tag_key)
+                    else:
+                        pipe.expire(tag_key, expire, nx=True)
+                        pipe.expire(tag_key, expire, gt=True)
+            if deletes:
+                pipe.delete(*deletes)
+            pipe.publish(owner.INVALIDATION_CHANNEL, owner._invalidation_message(*sets, *deletes))
+            await pipe.execute()
+        except (RedisError, OSError) as e:
+            owner._mark_down(e)
+            # 重新写入 L1（_mark_down 会清空 L1）；带快照的回写无法再确认是否失效，不再写入
+            for key, (value, expire, tags, snapshot) in sets.items():
+                if snapshot is None:
+                    owner._local.set(key, value, owner._local_ttl_for(expire), tags)
+
+
 # 全局缓存实例
 cache = Cache()
 
 
+# 实体标签：表名 -> (标签前缀, 属性)；另外每个实体都带表名标签
+_ENTITY_TAGS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "projects": (("project", "id"),),
+    "tasks": (("project", "project_id"), ("task", "id")),
+    "materials": (("material", "id"),),
+    "inventory": (("material", "material_id"),),
+    "inventory_logs": (("material", "material_id"),),
+    "notifications": (("notifications", "user_id"),),
+}
+
+
+def entity_tags(obj: Any) -> Set[str]:
+    """
+    实体对应的缓存标签，如 Task -> {"tasks", "project:3", "task:12"}
+    
+    属性被修改时新旧取值都计入（任务换项目时两个项目的缓存都失效）。
+    """
+    table = obj.__table__.name
+    tags = {table}
+    state = sa_inspect(obj)
+    for prefix, attr in _ENTITY_TAGS.get(table, ()):
+        values = {state.dict.get(attr), *(state.attrs[attr].history.deleted or ())}
+        tags.update(f"{prefix}:{value}" for value in values if value is not None)
+    return tags
+
+
+def add_session_tags(session: Union[Session, AsyncSession], *tags: str):
+    """登记提交后需要失效的标签（用于不经过 ORM 实体的批量写入）"""
+    session = getattr(session, "sync_session", session)
+    session.info.setdefault("cache_tags", set()).update(tags)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_entity_tags(session: Session, flush_context):
+    tags = session.info.setdefault("cache_tags", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if hasattr(obj, "__table__"):
+            tags.update(entity_tags(obj))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_statement_tags(orm_execute_state):
+    # 批量 INSERT / UPDATE / DELETE 只能确定到表
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        add_session_tags(orm_execute_state.session, orm_execute_state.statement.table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_tags(session: Session):
+    """
+    提交成功后失效标签；在 AsyncSession.commit() 返回前完成，保证写后读一致
+    
+    本进程 L1 同步剔除；Redis 失效最多等待 CACHE_INVALIDATE_TIMEOUT 秒，
+    超时按 Redis 故障处理（退避期内不读 Redis，避免读到未删除的旧值），不阻塞写请求。
+    """
+    tags = session.info.pop("cache_tags", None)
+    if not tags:
+        return
+    tags = sorted(tags)
+    cache._local.invalidate_tags(tags)
+    if not in_greenlet():
+        return
+    try:
+        await_only(asyncio.wait_for(cache.invalidate_tags(*tags), settings.CACHE_INVALIDATE_TIMEOUT))
+    except asyncio.TimeoutError as e:
+        logger.warning("提交后缓存失效超时 %s", tags)
+        cache._mark_down(e)
+    except Exception as e:
+        logger.warning("提交后缓存失效失败 %s: %s", tags, e)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_session_tags(session: Session):
+    session.info.pop("cache_tags", None)
+
+
+# 进行中的计算（单飞）与后台刷新任务
+_inflight: Dict[str, "asyncio.Future"] = {}
+_background: Set["asyncio.Task"] = set()
+
+
+def _single_flight(key: str, compute: Callable[[], Awaitable[Any]]) -> "asyncio.Future":
+    """同一 key 在本进程内只有一个计算任务，其余调用方等待同一结果"""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(compute())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return asyncio.shield(task)
+
+
+def _should_refresh_early(entry: Dict[str, Any], beta: float, now: float) -> bool:
+    """概率提前刷新（XFetch）：越接近过期、计算越慢，越可能提前重算"""
+    if beta <= 0:
+        return False
+    return now - entry["d"] * beta * math.log(random.random() or 1e-12) >= entry["e"]
+
+
+async def _compute_and_store(
+    key: str,
+    func: Callable[..., Awaitable[Any]],
+    args: tuple,
+    kwargs: dict,
+    expire: int,
+    stale_ttl: int,
+    lock_timeout: float,
+    tags: Tuple[str, ...] = ()
+) -> Any:
+    """
+    计算并写入缓存
+    
+    先取跨 worker 锁；未取得锁说明其他 worker 正在计算，轮询等待其结果，
+    超时后自行计算。
+    """
+    token = await cache.acquire_lock(key, lock_timeout)
+    if token is None:
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            entry = await cache.get(key)
+            if entry is not None and entry["e"] > time.time():
+                return entry["v"]
+    
+    try:
+        start = time.time()
+        result = await func(*args, **kwargs)
+        now = time.time()
+        entry = {"v": result, "d": now - start, "e": now + expire}
+        await cache.set(key, entry, expire=expire + stale_ttl, tags=tags)
+        return result
+    finally:
+        if token is not None:
+            await cache.release_lock(key, token)
+
+
+def _detached_compute(key: str, func, args: tuple, kwargs: dict, *options) -> Callable[[], Awaitable[Any]]:
+    """
+    单飞 / 后台计算任务
+    
+    计算任务被多个请求共享，不能使用发起请求的数据库会话（请求取消或结束时会话随之关闭），
+    参数中的会话换成绑定同一引擎的独立会话。已是计算任务自己的会话（嵌套缓存调用）时直接复用，
+    不再多占连接。
+    """
+    sessions = [value for value in (*args, *kwargs.values()) if isinstance(value, AsyncSession)]
+    if all(session.info.get("cache_detached") for session in sessions):
+        return lambda: _compute_and_store(key, func, args, kwargs, *options)
+    
+    async def compute():
+        async with async_sessionmaker(bind=sessions[0].bind, autoflush=False, expire_on_commit=False)() as db:
+            db.info["cache_detached"] = True
+            own_args = tuple(db if isinstance(arg, AsyncSession) else arg for arg in args)
+            own_kwargs = {
+                name: db if isinstance(value, AsyncSession) else value
+                for name, value in kwargs.items()
+            }
+            return await _compute_and_store(key, func, own_args, own_kwargs, *options)
+    
+    return compute
+
+
+async def _refresh_in_background(key: str, func, args: tuple, kwargs: dict, *options):
+    """后台刷新：不等待结果，过期窗口内先返回旧值"""
+    refresh = _detached_compute(key, func, args, kwargs, *options)
+    
+    async def run():
+        try:
+            await _single_flight(key, refresh)
+        except Exception as e:
+            logger.warning("后台刷新缓存失败 %s: %s", key, e)
+    
+    if key in _inflight:
+        return
+    task = asyncio.ensure_future(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+# 默认不参与缓存 key 的参数：数据库会话、当前用户
+_SKIP_ARG_NAMES = {"db", "current_user"}
+
+
+def _skip_arg(name: str, value: Any, include_user: bool) -> bool:
+    if name == "current_user":
+        return not include_user
+    return name in _SKIP_ARG_NAMES or isinstance(value, (AsyncSession, Request, Response, BackgroundTasks))
+
+
+def _lookup_arg(arguments: Dict[str, Any], path: str) -> Any:
+    """按 "name" 或 "name.field" 取参数值（字段支持 dict 与属性）"""
+    name, *fields = path.split(".")
+    value = arguments[name]
+    for field in fields:
+        value = value.get(field) if isinstance(value, dict) else getattr(value, field)
+    return value
+
+
+def make_key_builder(
+    func: Callable,
+    key_prefix: str = "",
+    key_args: Optional[Sequence[str]] = None,
+    include_user: bool = False
+) -> Callable[[tuple, dict], str]:
+    """
+    生成缓存 key 构造函数
+    
+    key 形如 "{前缀}:{函数名}:{参数摘要}"。参数按签名绑定（位置参数与关键字参数、
+    默认值均归一），序列化为键排序的 JSON 后取 blake2b 摘要，与调用方式、进程无关。
+    
+    Args:
+        key_prefix: 前缀，默认取模块名
+        key_args: 参与 key 的参数，支持 "current_user.id" 取字段；为 None 时取全部参数，
+            但跳过数据库会话、Request 等，以及 current_user（include_user=True 时保留）
+    """
+    signature = inspect.signature(func)
+    prefix = key_prefix or func.__module__.rsplit(".", 1)[-1]
+    name = func.__qualname__
+    
+    def build(args: tuple, kwargs: dict) -> str:
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        
+        if key_args is not None:
+            parts = {path: _lookup_arg(bound.arguments, path) for path in key_args}
+        else:
+            parts = {
+                arg: value for arg, value in bound.arguments.items()
+                if not _skip_arg(arg, value, include_user)
+            }
+        
+        try:
+            raw = codec.stable_dumps(parts)
+        except TypeError as e:
+            raise TypeError(f"{name} 的参数无法生成缓存 key，请通过 key_args 指定: {e}") from None
+        return f"{prefix}:{name}:{hashlib.blake2b(raw, digest_size=16).hexdigest()}"
+    
+    return build
+
+
 # 缓存装饰器
-def cached(expire: int = 300, key_prefix: str = ""):
+def cached(
+    expire: int = 300,
+    key_prefix: str = "",
+    stale_ttl: int = 0,
+    early_refresh_beta: float = 1.0,
+    lock_timeout: float = 10,
+    key_args: Optional[Sequence[str]] = None,
+    include_user: bool = False,
+    tags: Sequence[str] = ()
+):
     """
     缓存装饰器
     
+    - 单飞：同一 key 同时只计算一次（进程内共享结果，跨 worker 用 Redis 锁）
+    - 概率提前刷新：临近过期时由个别请求提前重算，避免集中失效
+    - stale-while-revalidate：过期后 stale_ttl 秒内先返回旧值，后台刷新
+    
     Args:
         expire: 过期时间（秒）
         key_prefix: 缓存 key 前缀
+        stale_ttl: 过期后仍可返回旧值的时长（秒），0 表示关闭
+        early_refresh_beta: 提前刷新系数，越大越早刷新，0 表示关闭
+        lock_timeout: 跨 worker 计算锁超时（秒）
+        key_args: 参与缓存 key 的参数，见 make_key_builder
+        include_user: 未指定 key_args 时是否按当前用户区分缓存
+        tags: 缓存标签，可引用参数，如 ("tasks", "project:{project_id}")
     """
     def decorator(func):
+        build_key = make_key_builder(func, key_prefix, key_args, include_user)
+        signature = inspect.signature(func)
+        
+        def build_tags(args: tuple, kwargs: dict) -> Tuple[str, ...]:
+            if not any("{" in tag for tag in tags):
+                return tuple(tags)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple(tag.format(**bound.arguments) for tag in tags)
+        
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             # 生成缓存 key
-            cache_key = f"{key_prefix}:{func.__name__}:{str(args)}:{str(kwargs)}"
+            cache_key = build_key(args, kwargs)
+            options = (expire, stale_ttl, lock_timeout, build_tags(args, kwargs))
             
             # 尝试从缓存获取
-            cached_value = await cache.get(cache_key)
-            if cached_value is not None:
-                return cached_value
+            entry = await cache.get(cache_key)
+            now = time.time()
+            if entry is not None:
+                if now < entry["e"]:
+                    if not _should_refresh_early(entry, early_refresh_beta, now):
+                        return entry["v"]
+                elif now < entry["e"] + stale_ttl:
+                    await _refresh_in_background(cache_key, func, args, kwargs, *options)
+                    return entry["v"]
             
-            # 执行函数
-            result = await func(*args, **kwargs)
-            
-            # 写入缓存
-            await cache.set(cache_key, result, expire=expire)
-            
-            return result
+            # 执行函数并写入缓存（计算任务使用独立会话，调用方取消不影响其他等待者）
+            return await _single_flight(
+                cache_key,
+                _detached_compute(cache_key, func, args, kwargs, *options)
+            )
         
         return wrapper
     return decorator
@@ -172,12 +969,12 @@ def clear_cache(*keys):
         keys: 要清除的缓存 key 列表
     """
     def decorator(func):
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             result = await func(*args, **kwargs)
             
             # 清除指定缓存
-            for key in keys:
-                await cache.delete(key)
+            await cache.delete_many(*keys)
             
             return result
         
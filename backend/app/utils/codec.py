@@ -0,0 +1,117 @@
+"""
+缓存序列化
+Redis 中的值统一为「1 字节编码标记 + 负载」，按 key 命名空间选择编码；
+不使用 pickle，读取 Redis 数据时不会执行任意代码
+"""
+
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 为可选加速依赖
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 未安装时回退为 JSON
+    msgpack = None
+
+
+def to_primitive(value: Any) -> Any:
+    """将 JSON / msgpack 不支持的类型转换为基础类型"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    raise TypeError(f"无法序列化的缓存值类型: {type(value).__name__}")
+
+
+class Codec:
+    """缓存编码：tag 为写入 Redis 的 1 字节标记"""
+
+    name = ""
+    tag = b""
+
+    def dumps(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """JSON 编码，已安装 orjson 时使用 orjson"""
+
+    name = "json"
+    tag = b"\x01"
+
+    def dumps(self, value: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(value, default=to_primitive, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(value, default=to_primitive, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def loads(self, data: bytes) -> Any:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+class MsgpackCodec(Codec):
+    """msgpack 编码：数值密集的负载体积更小"""
+
+    name = "msgpack"
+    tag = b"\x02"
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=to_primitive, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec() if msgpack is not None else JSON
+
+_BY_TAG: Dict[bytes, Codec] = {codec.tag: codec for codec in (JSON, MSGPACK)}
+
+
+def encode(value: Any, codec: Codec = JSON) -> bytes:
+    """编码为带标记的字节串"""
+    return codec.tag + codec.dumps(value)
+
+
+def decode(data: bytes) -> Any:
+    """
+    按标记解码
+
+    无标记的数据（INCRBY 计数器、旧版本写入的 JSON）按 JSON 解析，
+    仍失败则原样返回字符串。
+    """
+    codec = _BY_TAG.get(data[:1])
+    if codec is not None:
+        return codec.loads(data[1:])
+    try:
+        return JSON.loads(data)
+    except ValueError:
+        return data.decode("utf-8", errors="replace")
+
+
+def stable_dumps(value: Any) -> bytes:
+    """确定性 JSON（键排序），用于生成缓存 key"""
+    if orjson is not None:
+        return orjson.dumps(
+            value,
+            default=to_primitive,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(value, default=to_primitive, sort_keys=True, separators=(",", ":")).encode()
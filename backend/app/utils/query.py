@@ -0,0 +1,141 @@
+"""
+查询工具
+列表查询的关联字段投影、游标（keyset）分页
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import Select
+
+
+def list_projection(model, *lookups: Tuple[Any, Any, str, str]) -> Select:
+    """
+    构造列表查询：主实体 + 关联表字段（LEFT JOIN 投影）
+
+    关联对象不经 ORM 关系懒加载，整页数据来自同一个结果集。
+
+    Args:
+        model: 主实体
+        lookups: (外键列, 关联模型, 关联字段名, 结果标签)
+
+    用法:
+        list_projection(Task, (Task.manager_id, User, "real_name", "manager_name"))
+    """
+    query = select(model)
+    for foreign_key, target, field, label in lookups:
+        target_alias = aliased(target)
+        query = (
+            query.add_columns(getattr(target_alias, field).label(label))
+            .outerjoin(target_alias, foreign_key == target_alias.id)
+        )
+    return query
+
+
+def row_to_dict(row, fields: Iterable[str]) -> Dict[str, Any]:
+    """将 list_projection 结果行转换为字典：主实体字段 + 投影字段"""
+    entity, *_ = row
+    data = {field: getattr(entity, field) for field in fields}
+    for key, value in row._mapping.items():
+        if isinstance(key, str) and value is not entity:
+            data[key] = value
+    return data
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """将排序键编码为不透明游标"""
+    raw = json.dumps([
+        value.isoformat() if isinstance(value, (date, datetime)) else value
+        for value in values
+    ])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence[Any]) -> List[Any]:
+    """解码游标，按排序列类型还原取值"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+
+        decoded = []
+        for column, value in zip(columns, values):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is date:
+                value = date.fromisoformat(value)
+            else:
+                value = python_type(value)
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+# 列表单页最大条数
+MAX_PAGE_SIZE = 1000
+
+
+def paginate(
+    query: Select,
+    columns: Sequence[Any],
+    skip: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    descending: bool = False
+) -> Select:
+    """
+    列表分页
+
+    cursor 为 None 时沿用 offset 分页（兼容模式）；
+    否则按 columns 做 keyset 分页，空字符串表示第一页。
+    keyset 模式多取一行，用于判断是否还有下一页。
+    """
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+
+    if cursor is None:
+        return query.offset(skip).limit(limit)
+
+    if cursor:
+        key = tuple_(*columns)
+        values = tuple_(*decode_cursor(cursor, columns))
+        query = query.where(key < values if descending else key > values)
+    return query.limit(limit + 1)
+
+
+def cursor_page(
+    items: List[Any],
+    limit: int,
+    cursor: Optional[str],
+    key: Callable[[Any], Sequence[Any]]
+):
+    """
+    组装分页结果
+
+    兼容模式直接返回列表；keyset 模式返回 {"items", "next_cursor"}，
+    最后一页的 next_cursor 为 None。
+    """
+    if cursor is None:
+        return items
+
+    has_more = len(items) > limit
+    items = items[:limit]
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(key(items[-1])) if has_more and items else None
+    }
+
+
+def upsert(db, model):
+    """INSERT … ON CONFLICT 语句（按连接方言选择 PostgreSQL / SQLite）"""
+    if db.bind.dialect.name == "postgresql":
+        return pg_insert(model)
+    return sqlite_insert(model)
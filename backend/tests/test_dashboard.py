@@ -34,6 +34,40 @@ class TestDashboard:
         data = response.json()
         assert isinstance(data, list)
     
+    async def test_get_project_progress_weighted(self, client: AsyncClient, auth_headers: dict):
+        """测试按工时加权的全部项目进度"""
+        response = await client.post(
+            "/api/projects",
+            json={"project_no": "TEST-WEIGHTED", "yacht_name": "加权进度测试", "status": "in_progress"},
+            headers=auth_headers
+        )
+        project_id = response.json()["id"]
+        
+        for task_no, hours, progress in [("1", 300, 100), ("2", 100, 20)]:
+            response = await client.post(
+                "/api/tasks",
+                json={
+                    "project_id": project_id, "task_no": task_no, "name": task_no, "task_type": "outfitting",
+                    "planned_work_hours": hours
+                },
+                headers=auth_headers
+            )
+            await client.put(
+                f"/api/tasks/{response.json()['id']}", json={"progress_percent": progress}, headers=auth_headers
+            )
+        
+        async def progress(weighted: str) -> float:
+            response = await client.get(
+                f"/api/dashboard/project-progress?limit=0&weighted={weighted}",
+                headers=auth_headers
+            )
+            assert response.status_code == 200
+            return next(item["progress"] for item in response.json() if item["name"] == "加权进度测试")
+        
+        # 加权 (100 * 300 + 20 * 100) / 400，算术平均 (100 + 20) / 2
+        assert await progress("true") == 80.0
+        assert await progress("false") == 60.0
+    
     async def test_get_task_distribution(self, client: AsyncClient, auth_headers: dict):
         """测试获取任务分布"""
         response = await client.get(
@@ -2,6 +2,7 @@
 物料和库存模块测试
 """
 
+import asyncio
 import pytest
 from httpx import AsyncClient
 
@@ -20,6 +21,40 @@ class TestMaterials:
         data = response.json()
         assert isinstance(data, list)
     
+    async def test_list_materials_by_warehouse(self, client: AsyncClient, auth_headers: dict):
+        """测试物料列表按仓库汇总库存"""
+        stock = {
+            "TEST-WH-1": [("main", 10), ("B", 5)],
+            "TEST-WH-2": [("B", 3)],
+            "OTHER-WH": [("main", 7)]
+        }
+        for code, lines in stock.items():
+            response = await client.post(
+                "/api/materials",
+                json={"code": code, "name": f"{code} 分仓物料", "unit": "个"},
+                headers=auth_headers
+            )
+            material_id = response.json()["id"]
+            for warehouse, quantity in lines:
+                await client.post(
+                    "/api/inventory/transaction",
+                    json={"material_id": material_id, "type": "in", "quantity": quantity, "warehouse": warehouse},
+                    headers=auth_headers
+                )
+        
+        response = await client.get(
+            "/api/materials?by_warehouse=true&keyword=TEST-WH",
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        materials = {material["code"]: material for material in response.json()}
+        assert set(materials) == {"TEST-WH-1", "TEST-WH-2"}
+        assert materials["TEST-WH-1"]["stock"] == 15
+        assert materials["TEST-WH-1"]["stock_by_warehouse"] == {"main": 10, "B": 5}
+        assert materials["TEST-WH-2"]["stock"] == 3
+        assert materials["TEST-WH-2"]["stock_by_warehouse"] == {"B": 3}
+    
     async def test_create_material(self, client: AsyncClient, auth_headers: dict):
         """测试创建物料"""
         material_data = {
@@ -153,6 +188,46 @@ class TestInventory:
         data = response.json()
         assert data["message"] == "操作成功"
     
+    async def test_inventory_out_fefo(self, client: AsyncClient, auth_headers: dict):
+        """测试出库按有效期分配批次，跳过未检验批次"""
+        response = await client.post(
+            "/api/materials",
+            json={"code": "TEST-FEFO", "name": "测试密封胶", "unit": "支"},
+            headers=auth_headers
+        )
+        material_id = response.json()["id"]
+        
+        for batch_no, qc_status, expiry_date in [
+            ("FEFO-A", "pass", "2030-06-01"),
+            ("FEFO-B", "pass", "2030-01-01"),
+            ("FEFO-C", "pending", "2029-01-01"),
+        ]:
+            await client.post(
+                "/api/inventory/transaction",
+                json={
+                    "material_id": material_id, "type": "in", "quantity": 10, "warehouse": "main",
+                    "batch_no": batch_no, "qc_status": qc_status, "expiry_date": expiry_date
+                },
+                headers=auth_headers
+            )
+        
+        response = await client.post(
+            "/api/inventory/transaction",
+            json={"material_id": material_id, "type": "out", "quantity": 15, "warehouse": "main"},
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        batches = [(item["batch_no"], item["quantity"]) for item in response.json()["batches"]]
+        assert batches == [("FEFO-B", 10), ("FEFO-A", 5)]
+        
+        # 剩余合格库存只有 5
+        response = await client.post(
+            "/api/inventory/transaction",
+            json={"material_id": material_id, "type": "out", "quantity": 6, "warehouse": "main"},
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+    
     async def test_inventory_out_insufficient(
         self, client: AsyncClient, auth_headers: dict
     ):
@@ -172,6 +247,142 @@ class TestInventory:
         
         assert response.status_code == 400
     
+    async def test_inventory_concurrent_out(self, client: AsyncClient, auth_headers: dict):
+        """测试并发出库：不超卖、无丢失更新"""
+        response = await client.post(
+            "/api/materials",
+            json={"code": "TEST-CONCURRENT", "name": "并发出库物料", "unit": "个"},
+            headers=auth_headers
+        )
+        material_id = response.json()["id"]
+        
+        await client.post(
+            "/api/inventory/transaction",
+            json={"material_id": material_id, "type": "in", "quantity": 150, "warehouse": "main"},
+            headers=auth_headers
+        )
+        
+        # 测试引擎不使用连接池，限制同时打开的连接数
+        semaphore = asyncio.Semaphore(50)
+        
+        async def issue():
+            async with semaphore:
+                return await client.post(
+                    "/api/inventory/transaction",
+                    json={"material_id": material_id, "type": "out", "quantity": 1, "warehouse": "main"},
+                    headers=auth_headers
+                )
+        
+        responses = await asyncio.gather(*[issue() for _ in range(200)])
+        status_codes = [r.status_code for r in responses]
+        assert status_codes.count(200) == 150
+        assert status_codes.count(400) == 50
+        
+        response = await client.get(
+            f"/api/inventory?material_id={material_id}",
+            headers=auth_headers
+        )
+        assert [float(item["quantity"]) for item in response.json()] == [0]
+    
+    async def test_inventory_batch_transaction(self, client: AsyncClient, auth_headers: dict):
+        """测试批量出入库：整体生效或整体回滚"""
+        response = await client.post(
+            "/api/materials",
+            json={"code": "TEST-BATCH", "name": "批量领料物料", "unit": "个"},
+            headers=auth_headers
+        )
+        material_id = response.json()["id"]
+        
+        lines = [
+            {"material_id": material_id, "type": "in", "quantity": 100, "warehouse": "main"},
+            {"material_id": material_id, "type": "transfer", "quantity": 30, "warehouse": "main", "to_warehouse": "B"},
+            {"material_id": material_id, "type": "out", "quantity": 20, "warehouse": "B"}
+        ]
+        response = await client.post(
+            "/api/inventory/transaction/batch",
+            json={"lines": lines, "remark": "焊接套件"},
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        quantities = {item["warehouse"]: item["quantity"] for item in response.json()["inventory"]}
+        assert quantities == {"main": 70, "B": 10}
+        
+        # 第 2 行库存不足，第 1 行入库也不生效
+        response = await client.post(
+            "/api/inventory/transaction/batch",
+            json={"lines": [
+                {"material_id": material_id, "type": "in", "quantity": 5, "warehouse": "main"},
+                {"material_id": material_id, "type": "out", "quantity": 500, "warehouse": "B"}
+            ]},
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+        
+        response = await client.get(
+            f"/api/inventory?material_id={material_id}&warehouse=main",
+            headers=auth_headers
+        )
+        assert [float(item["quantity"]) for item in response.json()] == [70]
+    
+    async def test_inventory_batch_transaction_by_batch(self, client: AsyncClient, auth_headers: dict):
+        """测试批量出库 / 调出按批次 FEFO 分配，每个消耗的批次一条日志"""
+        response = await client.post(
+            "/api/materials",
+            json={"code": "TEST-BATCH-FEFO", "name": "批次领料物料", "unit": "支"},
+            headers=auth_headers
+        )
+        material_id = response.json()["id"]
+        
+        for batch_no, qc_status, expiry_date in [
+            ("BF-A", "pass", "2030-06-01"),
+            ("BF-B", "pass", "2030-01-01"),
+            ("BF-C", "pending", "2029-01-01"),
+        ]:
+            await client.post(
+                "/api/inventory/transaction",
+                json={
+                    "material_id": material_id, "type": "in", "quantity": 10, "warehouse": "main",
+                    "batch_no": batch_no, "qc_status": qc_status, "expiry_date": expiry_date
+                },
+                headers=auth_headers
+            )
+        
+        lines = [
+            {"material_id": material_id, "type": "out", "quantity": 12, "warehouse": "main"},
+            {"material_id": material_id, "type": "transfer", "quantity": 5, "warehouse": "main", "to_warehouse": "B"}
+        ]
+        response = await client.post(
+            "/api/inventory/transaction/batch",
+            json={"lines": lines},
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        quantities = {item["warehouse"]: float(item["quantity"]) for item in response.json()["inventory"]}
+        # 待检批次 BF-C 不参与分配，仍计入仓库库存
+        assert quantities == {"main": 13, "B": 5}
+        
+        response = await client.get(f"/api/inventory/logs?material_id={material_id}", headers=auth_headers)
+        outbound = sorted(float(log["quantity"]) for log in response.json() if log["type"] == "out")
+        assert outbound == [2, 10]
+        
+        # 剩余合格批次库存只有 BF-A 的 3
+        response = await client.post(
+            "/api/inventory/transaction/batch",
+            json={"lines": [{"material_id": material_id, "type": "out", "quantity": 4, "warehouse": "main"}]},
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+    
+    async def test_stock_balances_reconcile(self, client: AsyncClient, auth_headers: dict):
+        """测试库存余额与库存日志一致"""
+        response = await client.post(
+            "/api/inventory/balances/reconcile?dry_run=true",
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        assert response.json()["mismatches"] == []
+    
     async def test_inventory_logs(self, client: AsyncClient, auth_headers: dict):
         """测试获取库存日志"""
         response = await client.get(
@@ -193,3 +404,34 @@ class TestInventory:
         assert response.status_code == 200
         data = response.json()
         assert isinstance(data, list)
+    
+    async def test_inventory_alert_threshold(self, client: AsyncClient, auth_headers: dict):
+        """测试库存跨越阈值时产生、升级、解除预警"""
+        response = await client.post(
+            "/api/materials",
+            json={"code": "TEST-ALERT", "name": "预警物料", "unit": "个", "min_stock": 10, "safety_stock": 30},
+            headers=auth_headers
+        )
+        material_id = response.json()["id"]
+        
+        async def transact(type: str, quantity: int):
+            response = await client.post(
+                "/api/inventory/transaction",
+                json={"material_id": material_id, "type": type, "quantity": quantity, "warehouse": "main"},
+                headers=auth_headers
+            )
+            assert response.status_code == 200
+            response = await client.get("/api/inventory/alerts", headers=auth_headers)
+            return [alert for alert in response.json() if alert["material_id"] == material_id]
+        
+        assert await transact("in", 100) == []
+        
+        alerts = await transact("out", 75)
+        assert [alert["level"] for alert in alerts] == ["warning"]
+        assert alerts[0]["current_stock"] == 25
+        
+        alerts = await transact("out", 20)
+        assert [alert["level"] for alert in alerts] == ["critical"]
+        assert alerts[0]["shortage"] == 5
+        
+        assert await transact("in", 100) == []
@@ -20,6 +20,44 @@ class TestProjects:
         data = response.json()
         assert isinstance(data, list)
     
+    async def test_list_projects_task_stats(self, client: AsyncClient, auth_headers: dict):
+        """测试项目列表任务统计字段"""
+        response = await client.post(
+            "/api/projects",
+            json={"project_no": "TEST-STATS", "yacht_name": "统计测试"},
+            headers=auth_headers
+        )
+        project_id = response.json()["id"]
+        
+        # 已完成 300 工时 / 延期 100 工时进度 20 / 未填工时进度 50
+        for task_no, status, hours, progress in [
+            ("1", "completed", 300, 100), ("2", "delayed", 100, 20), ("3", "in_progress", None, 50)
+        ]:
+            response = await client.post(
+                "/api/tasks",
+                json={
+                    "project_id": project_id, "task_no": task_no, "name": task_no, "task_type": "outfitting",
+                    "status": status, "planned_work_hours": hours
+                },
+                headers=auth_headers
+            )
+            await client.put(
+                f"/api/tasks/{response.json()['id']}", json={"progress_percent": progress}, headers=auth_headers
+            )
+        
+        response = await client.get(
+            "/api/projects",
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        project = next(item for item in response.json() if item["id"] == project_id)
+        assert project["total_tasks"] == 3
+        assert project["completed_tasks"] == 1
+        assert project["delayed_tasks"] == 1
+        # 按计划工时加权：(100 * 300 + 20 * 100) / 400
+        assert project["progress_percent"] == 80
+    
     async def test_create_project(self, client: AsyncClient, auth_headers: dict):
         """测试创建项目"""
         project_data = {
@@ -127,3 +165,112 @@ class TestProjects:
         assert response.status_code == 200
         data = response.json()
         assert isinstance(data, list)
+    
+    async def test_project_schedule(self, client: AsyncClient, auth_headers: dict):
+        """测试关键路径进度计划与循环依赖检查"""
+        response = await client.post(
+            "/api/projects",
+            json={"project_no": "TEST-CPM", "yacht_name": "关键路径测试", "start_date": "2024-03-01"},
+            headers=auth_headers
+        )
+        project_id = response.json()["id"]
+        
+        task_ids = {}
+        for task_no, duration, dependencies in [("A", 5, []), ("B", 3, ["A"]), ("C", 2, ["A"]), ("D", 4, ["B", "C"])]:
+            response = await client.post(
+                "/api/tasks",
+                json={
+                    "project_id": project_id, "task_no": task_no, "name": task_no, "task_type": "hull_construction",
+                    "plan_start": "2024-03-01", "duration_days": duration,
+                    "dependencies": [task_ids[name] for name in dependencies]
+                },
+                headers=auth_headers
+            )
+            task_ids[task_no] = response.json()["id"]
+        
+        response = await client.get(f"/api/projects/{project_id}/schedule", headers=auth_headers)
+        assert response.status_code == 200
+        schedule = response.json()
+        assert schedule["finish_date"] == "2024-03-12"
+        assert schedule["critical_path"] == [task_ids["A"], task_ids["B"], task_ids["D"]]
+        floats = {task["task_no"]: task["total_float"] for task in schedule["tasks"]}
+        assert floats == {"A": 0, "B": 0, "C": 1, "D": 0}
+        
+        # A 依赖 D 形成循环
+        response = await client.put(
+            f"/api/tasks/{task_ids['A']}/dependencies",
+            json=[{"depends_on_task_id": task_ids["D"]}],
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+
+    async def test_project_wbs(self, client: AsyncClient, auth_headers: dict):
+        """测试 WBS 树与父任务进度汇总"""
+        response = await client.post(
+            "/api/projects",
+            json={"project_no": "TEST-WBS", "yacht_name": "WBS测试"},
+            headers=auth_headers
+        )
+        project_id = response.json()["id"]
+        
+        async def create(task_no, parent_id=None, hours=None, progress=0):
+            response = await client.post(
+                "/api/tasks",
+                json={
+                    "project_id": project_id, "task_no": task_no, "name": task_no, "task_type": "outfitting",
+                    "parent_id": parent_id, "planned_work_hours": hours
+                },
+                headers=auth_headers
+            )
+            task_id = response.json()["id"]
+            await client.put(f"/api/tasks/{task_id}", json={"progress_percent": progress}, headers=auth_headers)
+            return task_id
+        
+        root = await create("1")
+        await create("1.1", root, hours=300, progress=100)
+        await create("1.2", root, hours=100, progress=20)
+        
+        response = await client.get(f"/api/projects/{project_id}/wbs", headers=auth_headers)
+        assert response.status_code == 200
+        wbs = response.json()
+        assert wbs["total_tasks"] == 2
+        assert [node["task_no"] for node in wbs["nodes"][0]["children"]] == ["1.1", "1.2"]
+        assert wbs["nodes"][0]["progress_percent"] == 80.0
+        
+        response = await client.get("/api/projects/99999/wbs", headers=auth_headers)
+        assert response.status_code == 404
+    
+    async def test_project_gantt(self, client: AsyncClient, auth_headers: dict):
+        """测试甘特图时间窗过滤与 ETag 条件请求"""
+        response = await client.post(
+            "/api/projects",
+            json={"project_no": "TEST-GANTT", "yacht_name": "甘特图测试", "start_date": "2024-03-01"},
+            headers=auth_headers
+        )
+        project_id = response.json()["id"]
+        
+        for task_no, plan_start, plan_end in [("1", "2024-03-01", "2024-03-10"), ("2", "2024-04-01", "2024-04-20")]:
+            await client.post(
+                "/api/tasks",
+                json={
+                    "project_id": project_id, "task_no": task_no, "name": task_no, "task_type": "design",
+                    "plan_start": plan_start, "plan_end": plan_end
+                },
+                headers=auth_headers
+            )
+        
+        response = await client.get(
+            f"/api/projects/{project_id}/gantt?start=2024-03-15&end=2024-04-30",
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        gantt = response.json()
+        assert gantt["task_nos"] == ["2"]
+        assert gantt["plan_start"] == [31] and gantt["plan_end"] == [50]
+        
+        etag = response.headers["etag"]
+        response = await client.get(
+            f"/api/projects/{project_id}/gantt?start=2024-03-15&end=2024-04-30",
+            headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 304
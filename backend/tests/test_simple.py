@@ -63,6 +63,34 @@ def test_excel_importer():
     print("✓ Excel导入工具正常")
 
 
+def test_excel_parse_tasks():
+    """测试任务表按列解析：日期格式、枚举映射、数值容错与问题行号"""
+    from datetime import datetime
+    import pandas as pd
+    from app.utils.excel_importer import ExcelImporter
+    
+    df = pd.DataFrame({
+        '序号': ['1.1', '1.2', None],
+        '项目/任务名称': [' 船体放样 ', '舾装', '无序号'],
+        '任务类型': ['船体制作', '未知', None],
+        '状态': ['进行中', None, None],
+        '计划开始': [datetime(2024, 3, 1), '2024/3/5', 'bad'],
+        '计划工时': ['12.7', 'abc', 8],
+    })
+    importer = ExcelImporter("test.xlsx")
+    tasks = importer.parse_tasks(df, project_id=7)
+    
+    assert [task['task_no'] for task in tasks] == ['1.1', '1.2']
+    assert tasks[0]['name'] == '船体放样' and tasks[0]['task_type'] == 'hull_construction'
+    assert tasks[1]['task_type'] == 'other' and tasks[1]['status'] == 'not_started'
+    assert [task['plan_start'] for task in tasks] == ['2024-03-01', '2024-03-05']
+    assert [task['planned_work_hours'] for task in tasks] == [12, 0]
+    assert tasks[0]['project_id'] == 7 and tasks[0]['delay_reason'] == ''
+    # 第 4 行（表头为第 1 行）日期无法识别且缺少序号
+    assert importer.warnings == ['任务第 4 行：「计划开始」日期无法识别', '任务第 4 行：缺少序号或任务名称，已跳过']
+    print("✓ Excel任务解析正常")
+
+
 def test_cache_utils():
     """测试缓存工具"""
     from app.utils.cache import Cache, cached
@@ -76,6 +104,224 @@ def test_cache_utils():
     print("✓ 缓存工具正常")
 
 
+def test_local_cache():
+    """测试进程内 LRU 缓存"""
+    from app.utils.cache import LocalCache
+    
+    local = LocalCache(max_entries=2)
+    local.set("a", 1, ttl=60)
+    local.set("b", 2, ttl=60)
+    local.get("a")
+    local.set("c", 3, ttl=60)
+    
+    # 超出容量时淘汰最久未使用的 b
+    assert local.get("a") == 1
+    assert local.get("b") is None
+    assert local.get("c") == 3
+    
+    local.set("d", 4, ttl=0)
+    assert local.get("d") is None
+    
+    # 按标签剔除
+    local.set("e", 5, ttl=60, tags=("project:1",))
+    local.set("f", 6, ttl=60, tags=("project:1", "tasks"))
+    local.invalidate_tags(["tasks"])
+    assert local.get("e") == 5
+    assert local.get("f") is None
+    print("✓ 本地缓存正常")
+
+
+def test_cached_single_flight():
+    """测试缓存装饰器单飞：并发请求只计算一次"""
+    import asyncio
+    from app.utils.cache import cached
+    
+    calls = []
+    
+    @cached(expire=60, key_prefix="test")
+    async def compute(x):
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        return {"value": x}
+    
+    async def run():
+        return await asyncio.gather(*[compute(1) for _ in range(20)])
+    
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result == {"value": 1} for result in results)
+    print("✓ 缓存单飞正常")
+
+
+def test_cache_key_and_codec():
+    """测试缓存 key 确定性与序列化"""
+    from datetime import date
+    from decimal import Decimal
+    from app.utils import codec
+    from app.utils.cache import make_key_builder
+    
+    async def list_items(project_id: int, status: str = None, db=None, current_user=None):
+        pass
+    
+    build = make_key_builder(list_items, "items")
+    key = build((1,), {"db": object(), "current_user": {"id": 1}})
+    # 位置 / 关键字传参、会话与当前用户不影响 key
+    assert key == build((), {"project_id": 1, "status": None, "db": object()})
+    assert key != build((2,), {})
+    assert key.startswith("items:")
+    
+    by_user = make_key_builder(list_items, "items", key_args=["project_id", "current_user.id"])
+    assert by_user((1,), {"current_user": {"id": 1}}) != by_user((1,), {"current_user": {"id": 2}})
+    
+    value = {"count": 1, "day": date(2024, 1, 1), "qty": Decimal("1.5"), "name": "螺栓"}
+    expected = {"count": 1, "day": "2024-01-01", "qty": 1.5, "name": "螺栓"}
+    assert codec.decode(codec.encode(value, codec.JSON)) == expected
+    assert codec.decode(codec.encode(value, codec.MSGPACK)) == expected
+    assert codec.decode(codec.encode("123")) == "123"
+    # 计数器等无标记的值
+    assert codec.decode(b"42") == 42
+    print("✓ 缓存 key 与序列化正常")
+
+
+def test_cache_batch():
+    """测试缓存批量读写"""
+    import asyncio
+    from app.utils.cache import Cache
+    
+    async def run():
+        cache = Cache()
+        await cache.set_many({"a": 1, "b": {"x": 2}}, expire=60)
+        async with cache.pipeline() as pipe:
+            pipe.set("c", 3, expire=60)
+            pipe.delete("a")
+        found = await cache.get_many(["a", "b", "c"])
+        await cache.delete_many("b", "c")
+        return found, await cache.get_many(["b", "c"])
+    
+    found, after_delete = asyncio.run(run())
+    assert found == {"b": {"x": 2}, "c": 3}
+    assert after_delete == {}
+    print("✓ 缓存批量读写正常")
+
+
+def test_cache_snapshot_write_back():
+    """测试带标签快照的回写：快照后标签被失效则不写入"""
+    import asyncio
+    from app.utils.cache import Cache
+    
+    async def run():
+        cache = Cache()
+        snapshot = await cache.tag_snapshot("material:1")
+        await cache.invalidate_tags("material:1")
+        async with cache.pipeline() as pipe:
+            pipe.set("material:1:stock", {"total": 1}, expire=60, tags=("material:1",), snapshot=snapshot)
+        stale = await cache.get("material:1:stock")
+        
+        snapshot = await cache.tag_snapshot("material:1")
+        async with cache.pipeline() as pipe:
+            pipe.set("material:1:stock", {"total": 2}, expire=60, tags=("material:1",), snapshot=snapshot)
+        return stale, await cache.get("material:1:stock")
+    
+    stale, fresh = asyncio.run(run())
+    assert stale is None
+    assert fresh == {"total": 2}
+    print("✓ 缓存快照回写正常")
+
+
+def test_alert_level():
+    """测试库存预警级别"""
+    from decimal import Decimal
+    from app.services.stock_alert_service import alert_level
+    
+    assert alert_level(Decimal(50), Decimal(10), Decimal(30)) is None
+    assert alert_level(Decimal(25), Decimal(10), Decimal(30)) == "warning"
+    assert alert_level(Decimal(5), Decimal(10), Decimal(30)) == "critical"
+    assert alert_level(Decimal(0), None, Decimal(0)) is None
+    print("✓ 库存预警级别正常")
+
+
+def test_batch_allocation():
+    """测试出库批次分配"""
+    from decimal import Decimal
+    from app.services.inventory_service import allocate
+    
+    # (排序键, 库存记录 id, 可用数量)
+    candidates = [(3, 1, Decimal(10)), (1, 2, Decimal(4)), (2, 3, Decimal(5))]
+    assert allocate(candidates, Decimal(6)) == [(2, Decimal(4), Decimal(4)), (3, Decimal(5), Decimal(2))]
+    assert allocate(candidates, Decimal(20)) is None
+    print("✓ 出库批次分配正常")
+
+
+def test_critical_path():
+    """测试关键路径计算与循环检测"""
+    from app.services.schedule_service import critical_path, DependencyCycleError
+    
+    # A(5) -> B(3) -> D(4)，A -> C(2) -> D；C 与 A 同时开始（SS）
+    tasks = {1: (0, 5), 2: (0, 3), 3: (0, 2), 4: (0, 4)}
+    edges = [(1, 2, "finish_to_start"), (1, 3, "start_to_start"), (2, 4, "finish_to_start"), (3, 4, "finish_to_start")]
+    order, schedule = critical_path(tasks, edges)
+    assert order.index(1) < order.index(2) < order.index(4)
+    assert schedule[4] == (8, 12, 8, 12)
+    assert schedule[3] == (0, 2, 6, 8)
+    
+    try:
+        critical_path(tasks, edges + [(4, 1, "finish_to_start")])
+        assert False, "应检测到循环依赖"
+    except DependencyCycleError as e:
+        assert set(e.cycle) <= {1, 2, 3, 4} and len(e.cycle) == 3
+    print("✓ 关键路径计算正常")
+
+
+def test_forecast_window():
+    """测试预计日期：前置约束与在建任务剩余工期"""
+    from types import SimpleNamespace
+    from datetime import date
+    from app.services.schedule_service import forecast_window
+    
+    def task(**fields):
+        defaults = dict(plan_start=date(2024, 3, 1), plan_end=date(2024, 3, 10), duration_days=None,
+                        actual_start=None, actual_end=None, progress_percent=0)
+        return SimpleNamespace(**dict(defaults, **fields))
+    
+    today = date(2024, 3, 20)
+    bounds = [("finish_to_start", date(2024, 2, 20), date(2024, 3, 4))]
+    assert forecast_window(task(), bounds, today) == (date(2024, 3, 5), date(2024, 3, 14))
+    # 已开工未完工：10 天工期完成 40%，剩余 6 天从今天算起
+    started = task(actual_start=date(2024, 3, 1), progress_percent=40)
+    assert forecast_window(started, [], today) == (date(2024, 3, 1), date(2024, 3, 25))
+    assert forecast_window(started, [], date(2024, 3, 2)) == (date(2024, 3, 1), date(2024, 3, 10))
+    # SF 在前置任务开工前一天完工，与关键路径一致
+    assert forecast_window(task(), [("start_to_finish", date(2024, 3, 20), date(2024, 3, 25))], today) == (
+        date(2024, 3, 10), date(2024, 3, 19)
+    )
+    finished = task(actual_start=date(2024, 3, 1), actual_end=date(2024, 3, 12), progress_percent=100)
+    assert forecast_window(finished, [], today) == (date(2024, 3, 1), date(2024, 3, 12))
+    print("✓ 预计日期推算正常")
+
+
+def test_wbs_rollup():
+    """测试 WBS 树组装与进度汇总"""
+    from collections import namedtuple
+    from app.services.progress_service import build_wbs
+    
+    Row = namedtuple("Row", "id parent_id task_no name status level plan_start plan_end planned_work_hours progress_percent depth")
+    rows = [
+        Row(1, None, "1", "船体", None, 1, None, None, None, 0, 1),
+        Row(2, 1, "1.1", "分段", None, 2, None, None, None, 0, 2),
+        Row(3, 1, "1.2", "合拢", None, 2, None, None, 100, 50, 2),
+        Row(4, 2, "1.1.1", "下料", None, 3, None, None, 300, 100, 3),
+        Row(5, 2, "1.1.2", "焊接", None, 3, None, None, 100, 0, 3),
+    ]
+    roots, total = build_wbs(rows)
+    assert [node["id"] for node in roots] == [1]
+    assert [node["id"] for node in roots[0]["children"]] == [2, 3]
+    assert roots[0]["children"][0]["progress_percent"] == 75.0
+    # (100*300 + 0*100 + 50*100) / 500
+    assert roots[0]["progress_percent"] == 70.0
+    assert total == [3, 150.0, 35000.0, 500.0]
+    print("✓ WBS 进度汇总正常")
+
+
 if __name__ == "__main__":
     print("运行 Yacht MES 简单测试...\n")
     
@@ -83,6 +329,17 @@ if __name__ == "__main__":
     test_security_utils()
     test_config()
     test_excel_importer()
+    test_excel_parse_tasks()
     test_cache_utils()
+    test_local_cache()
+    test_cached_single_flight()
+    test_cache_key_and_codec()
+    test_cache_batch()
+    test_cache_snapshot_write_back()
+    test_alert_level()
+    test_batch_allocation()
+    test_critical_path()
+    test_forecast_window()
+    test_wbs_rollup()
     
     print("\n✅ 所有简单测试通过！")
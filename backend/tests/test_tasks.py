@@ -3,6 +3,7 @@
 """
 
 import pytest
+from datetime import date, timedelta
 from httpx import AsyncClient
 
 
@@ -11,14 +12,74 @@ class TestTasks:
     
     async def test_list_tasks(self, client: AsyncClient, auth_headers: dict):
         """测试获取任务列表"""
-        response = await client.get(
+        response = await client.post(
+            "/api/users",
+            json={"username": "task_manager", "password": "manager123", "real_name": "任务负责人", "role": "team_leader"},
+            headers=auth_headers
+        )
+        manager_id = response.json()["id"]
+        response = await client.post(
+            "/api/projects",
+            json={"project_no": "TEST-MANAGER", "yacht_name": "负责人测试"},
+            headers=auth_headers
+        )
+        project_id = response.json()["id"]
+        await client.post(
             "/api/tasks",
+            json={
+                "project_id": project_id, "task_no": "1", "name": "舾装", "task_type": "outfitting",
+                "manager_id": manager_id
+            },
+            headers=auth_headers
+        )
+        
+        response = await client.get(
+            f"/api/tasks?project_id={project_id}",
             headers=auth_headers
         )
         
         assert response.status_code == 200
         data = response.json()
         assert isinstance(data, list)
+        assert [task["manager_name"] for task in data] == ["任务负责人"]
+    
+    async def test_list_tasks_cursor(self, client: AsyncClient, auth_headers: dict):
+        """测试任务列表游标分页"""
+        response = await client.get(
+            "/api/tasks?cursor=&limit=1",
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert "items" in data
+        assert "next_cursor" in data
+        
+        if data["next_cursor"]:
+            next_response = await client.get(
+                f"/api/tasks?cursor={data['next_cursor']}&limit=1",
+                headers=auth_headers
+            )
+            assert next_response.status_code == 200
+            assert next_response.json()["items"][0]["id"] > data["items"][0]["id"]
+    
+    async def test_list_tasks_invalid_cursor(self, client: AsyncClient, auth_headers: dict):
+        """测试无效游标"""
+        response = await client.get(
+            "/api/tasks?cursor=invalid",
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 400
+    
+    async def test_list_tasks_invalid_limit(self, client: AsyncClient, auth_headers: dict):
+        """测试分页条数越界"""
+        for query in ("cursor=&limit=0", "cursor=&limit=-1", "limit=100000"):
+            response = await client.get(
+                f"/api/tasks?{query}",
+                headers=auth_headers
+            )
+            assert response.status_code == 422
     
     async def test_create_task(self, client: AsyncClient, auth_headers: dict):
         """测试创建任务"""
@@ -130,3 +191,155 @@ class TestTasks:
         assert response.status_code == 200
         data = response.json()
         assert isinstance(data, list)
+    
+    async def test_update_task_propagates_delay(self, client: AsyncClient, auth_headers: dict):
+        """测试前置任务延期后下游任务预计日期与延期天数同步更新"""
+        response = await client.post(
+            "/api/projects",
+            json={"project_no": "TEST-PROPAGATE", "yacht_name": "延期传播测试"},
+            headers=auth_headers
+        )
+        project_id = response.json()["id"]
+        
+        task_ids = []
+        for task_no, plan_start, plan_end in [
+            ("1", "2024-03-01", "2024-03-10"),
+            ("2", "2024-03-11", "2024-03-15"),
+            ("3", "2024-03-16", "2024-03-20"),
+        ]:
+            response = await client.post(
+                "/api/tasks",
+                json={
+                    "project_id": project_id, "task_no": task_no, "name": f"船体焊接 {task_no}",
+                    "task_type": "hull_construction", "plan_start": plan_start, "plan_end": plan_end,
+                    "dependencies": task_ids[-1:]
+                },
+                headers=auth_headers
+            )
+            task_ids.append(response.json()["id"])
+        
+        response = await client.put(
+            f"/api/tasks/{task_ids[0]}",
+            json={"plan_end": "2024-03-14"},
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        
+        response = await client.get(f"/api/tasks?project_id={project_id}", headers=auth_headers)
+        tasks = {task["id"]: task for task in response.json()}
+        assert tasks[task_ids[1]]["forecast_start"] == "2024-03-15"
+        assert tasks[task_ids[1]]["forecast_delay_days"] == 4
+        assert tasks[task_ids[2]]["forecast_end"] == "2024-03-24"
+        assert tasks[task_ids[2]]["forecast_delay_days"] == 4
+        # 导入 / 手工填写的延期天数不被推算覆盖
+        assert tasks[task_ids[2]]["delay_days"] == 0
+    
+    async def test_update_progress_forecasts_remaining_work(self, client: AsyncClient, auth_headers: dict):
+        """测试在建任务按剩余工期从今天推算预计完成，并传播到下游"""
+        response = await client.post(
+            "/api/projects",
+            json={"project_no": "TEST-REMAINING", "yacht_name": "剩余工期测试"},
+            headers=auth_headers
+        )
+        project_id = response.json()["id"]
+        
+        task_ids = []
+        for task_no, plan_start, plan_end in [("1", "2024-03-01", "2024-03-10"), ("2", "2024-03-11", "2024-03-15")]:
+            response = await client.post(
+                "/api/tasks",
+                json={
+                    "project_id": project_id, "task_no": task_no, "name": f"舾装 {task_no}",
+                    "task_type": "outfitting", "plan_start": plan_start, "plan_end": plan_end,
+                    "dependencies": task_ids[-1:]
+                },
+                headers=auth_headers
+            )
+            task_ids.append(response.json()["id"])
+        
+        # 10 天工期完成 50%，剩余 5 天
+        response = await client.put(
+            f"/api/tasks/{task_ids[0]}",
+            json={"actual_start": "2024-03-01", "progress_percent": 50},
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        
+        forecast_end = date.today() + timedelta(days=4)
+        response = await client.get(f"/api/tasks?project_id={project_id}", headers=auth_headers)
+        tasks = {task["id"]: task for task in response.json()}
+        assert tasks[task_ids[0]]["forecast_end"] == forecast_end.isoformat()
+        assert tasks[task_ids[0]]["forecast_delay_days"] == (forecast_end - date(2024, 3, 10)).days
+        assert tasks[task_ids[1]]["forecast_start"] == (forecast_end + timedelta(days=1)).isoformat()
+    
+    async def test_batch_update_tasks(self, client: AsyncClient, auth_headers: dict):
+        """测试批量更新任务的乐观锁冲突结果"""
+        response = await client.post(
+            "/api/projects",
+            json={"project_no": "TEST-BATCH", "yacht_name": "批量更新测试"},
+            headers=auth_headers
+        )
+        project_id = response.json()["id"]
+        
+        task_ids = []
+        for task_no in ("1", "2"):
+            response = await client.post(
+                "/api/tasks",
+                json={"project_id": project_id, "task_no": task_no, "name": f"舾装 {task_no}", "task_type": "outfitting"},
+                headers=auth_headers
+            )
+            task_ids.append(response.json()["id"])
+        
+        response = await client.put(
+            "/api/tasks/batch",
+            json={"items": [
+                {"id": task_ids[0], "plan_start": "2024-05-01", "plan_end": "2024-05-20", "version": 1},
+                {"id": task_ids[1], "progress_percent": 30, "version": 5}
+            ]},
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["updated"] == 1 and data["conflicts"] == 1
+        assert data["results"][0] == {"id": task_ids[0], "status": "updated", "version": 2}
+        assert data["results"][1] == {"id": task_ids[1], "status": "conflict", "version": 1}
+        
+        response = await client.get(f"/api/tasks/{task_ids[0]}", headers=auth_headers)
+        assert response.json()["plan_end"] == "2024-05-20"
+        response = await client.get(f"/api/tasks/{task_ids[1]}", headers=auth_headers)
+        assert response.json()["progress_percent"] == 0
+    
+    async def test_report_work_batch(self, client: AsyncClient, auth_headers: dict):
+        """测试批量同步报工：工时累加、重复 client_id 不重复计入"""
+        response = await client.post(
+            "/api/projects",
+            json={"project_no": "TEST-REPORT", "yacht_name": "报工测试"},
+            headers=auth_headers
+        )
+        project_id = response.json()["id"]
+        response = await client.post(
+            "/api/tasks",
+            json={"project_id": project_id, "task_no": "1", "name": "船体焊接", "task_type": "hull_construction"},
+            headers=auth_headers
+        )
+        task_id = response.json()["id"]
+        
+        reports = [
+            {"task_id": task_id, "work_hours": 8, "progress_percent": 40, "client_id": "pad-1-001"},
+            {"task_id": task_id, "work_hours": 6, "progress_percent": 30, "client_id": "pad-2-001"},
+            {"task_id": 999999, "work_hours": 1, "progress_percent": 10}
+        ]
+        response = await client.post("/api/tasks/reports/batch", json={"reports": reports}, headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["accepted"] == 2
+        assert [row["status"] for row in data["results"]] == ["accepted", "accepted", "not_found"]
+        
+        # 终端重试整批
+        response = await client.post("/api/tasks/reports/batch", json={"reports": reports[:2]}, headers=auth_headers)
+        assert response.json()["duplicates"] == 2
+        
+        response = await client.get(f"/api/tasks/{task_id}", headers=auth_headers)
+        task = response.json()
+        assert task["actual_work_hours"] == 14
+        assert task["progress_percent"] == 40
+        assert task["status"] == "in_progress"
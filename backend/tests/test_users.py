@@ -9,16 +9,30 @@ from httpx import AsyncClient
 class TestUsers:
     """用户管理相关测试"""
     
-    async def test_list_users(self, client: AsyncClient, auth_headers: dict):
+    async def test_list_users(self, client: AsyncClient, auth_headers: dict, db_session):
         """测试获取用户列表"""
-        response = await client.get(
+        from app.models import Department
+        
+        department = Department(name="舾装部", code="TEST-OUTFIT")
+        db_session.add(department)
+        await db_session.commit()
+        await client.post(
             "/api/users",
+            json={"username": "dept_user", "password": "deptuser123", "real_name": "舾装工", "dept_id": department.id},
+            headers=auth_headers
+        )
+        
+        response = await client.get(
+            f"/api/users?dept_id={department.id}",
             headers=auth_headers
         )
         
         assert response.status_code == 200
         data = response.json()
         assert isinstance(data, list)
+        assert [(user["username"], user["dept_name"], user["team_name"]) for user in data] == [
+            ("dept_user", "舾装部", None)
+        ]
     
     async def test_create_user(self, client: AsyncClient, auth_headers: dict):
         """测试创建用户"""
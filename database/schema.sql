@@ -94,6 +94,9 @@ CREATE TABLE tasks (
     actual_start DATE,
     actual_end DATE,
     duration_days INTEGER, -- 计划工期
+    forecast_start DATE, -- 预计开始（按实际进度与前置任务推算）
+    forecast_end DATE, -- 预计完成
+    forecast_delay_days INTEGER DEFAULT 0, -- 预计延期天数（预计完成晚于计划完成）
     
     -- 工时管理
     planned_work_hours INTEGER, -- 计划工时
@@ -139,6 +142,20 @@ CREATE TABLE task_dependencies (
     UNIQUE(task_id, depends_on_task_id)
 );
 
+-- 报工流水（只追加），任务实际工时由流水原子累加
+CREATE TABLE work_reports (
+    id SERIAL PRIMARY KEY,
+    task_id INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    user_id INTEGER REFERENCES users(id),
+    work_hours INTEGER NOT NULL,
+    progress_percent INTEGER NOT NULL CHECK (progress_percent BETWEEN 0 AND 100),
+    remark TEXT,
+    photo_urls TEXT[],
+    client_id VARCHAR(64) UNIQUE, -- 终端生成的报工 id，离线同步重试时去重
+    reported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, -- 终端报工时间
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- ============================================================
 -- 3. 物料与采购管理（对应物料采购表）
 -- ============================================================
@@ -282,6 +299,30 @@ CREATE TABLE inventory_logs (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 库存余额（物料 + 仓库），出入库时同一事务内增量维护，可由 inventory_logs 重建
+CREATE TABLE stock_balances (
+    material_id INTEGER REFERENCES materials(id),
+    warehouse VARCHAR(50),
+    quantity DECIMAL(12,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (material_id, warehouse)
+);
+
+-- 物料总库存（各仓库合计）
+CREATE TABLE material_stock (
+    material_id INTEGER PRIMARY KEY REFERENCES materials(id),
+    quantity DECIMAL(12,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 生效中的库存预警（每物料至多一条），库存跨越最低库存 / 安全库存时增量维护
+CREATE TABLE stock_alerts (
+    material_id INTEGER PRIMARY KEY REFERENCES materials(id),
+    level VARCHAR(20) NOT NULL, -- warning: 低于安全库存, critical: 低于最低库存
+    raised_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- ============================================================
 -- 5. 文件与照片管理
 -- ============================================================
@@ -502,6 +543,9 @@ CREATE INDEX idx_tasks_type ON tasks(task_type);
 CREATE INDEX idx_tasks_dates ON tasks(plan_start, plan_end);
 CREATE INDEX idx_tasks_manager ON tasks(manager_id);
 CREATE INDEX idx_tasks_team ON tasks(team_id);
+CREATE INDEX idx_tasks_parent ON tasks(parent_id);
+CREATE INDEX idx_task_dependencies_depends_on ON task_dependencies(depends_on_task_id);
+CREATE INDEX idx_work_reports_task ON work_reports(task_id, reported_at);
 
 -- 物料表索引
 CREATE INDEX idx_materials_category ON materials(cat_id);
@@ -536,9 +580,19 @@ CREATE INDEX idx_tasks_project_status ON tasks(project_id, status);
 CREATE INDEX idx_tasks_type_status ON tasks(task_type, status);
 CREATE INDEX idx_procurement_status_date ON procurement_orders(status, order_date);
 CREATE INDEX idx_inventory_material_warehouse ON inventory(material_id, warehouse);
+-- 非批次库存每个仓库一行（出入库 upsert 的冲突目标）
+CREATE UNIQUE INDEX uq_inventory_material_warehouse ON inventory(material_id, warehouse) WHERE batch_no IS NULL;
+-- 出库按 FIFO / FEFO 分配批次
+CREATE INDEX idx_inventory_allocation ON inventory(material_id, warehouse, qc_status, expiry_date);
+
+-- 游标分页索引（按 created_at, id 倒序翻页）
+CREATE INDEX idx_inventory_logs_created_id ON inventory_logs(created_at, id);
+CREATE INDEX idx_audit_created_id ON audit_logs(created_at, id);
+CREATE INDEX idx_notifications_user_created_id ON notifications(user_id, created_at, id);
 
 -- 全文搜索索引（PostgreSQL）
 CREATE INDEX idx_materials_name_trgm ON materials USING gin (name gin_trgm_ops);
+CREATE INDEX idx_materials_code_trgm ON materials USING gin (code gin_trgm_ops);
 CREATE INDEX idx_projects_name_trgm ON projects USING gin (yacht_name gin_trgm_ops);
 
 -- 分区表示例（大数据量时考虑）